@@ -1,21 +1,34 @@
-import os, base64, cv2, json
+import os, base64, json, time, threading, uuid, asyncio
 import numpy as np
 from flask import Flask, render_template, request, redirect, session, jsonify, url_for
 from dotenv import load_dotenv
-from datetime import datetime
+from datetime import datetime, timedelta
+from concurrent.futures import ThreadPoolExecutor
 
-import face_recognition
 from pymongo import MongoClient
 import certifi
 
 from google_auth_oauthlib.flow import Flow
-from googleapiclient.discovery import build
-from google.oauth2.credentials import Credentials
 from bson.objectid import ObjectId
-from google.auth.transport.requests import Request
 from google.auth.exceptions import RefreshError
 from email.utils import parsedate_to_datetime
 
+from face_index import FaceIndex, FACE_MATCH_THRESHOLD, face_profile
+from face_pipeline import FaceEncoder, FacePoolBusy
+from gmail_client import INBOX_HEADERS, SENT_HEADERS, reply_headers, fetch_reply_headers
+from gmail_pool import GmailServicePool
+from mail_sync import MailSync, encode_cursor, decode_cursor
+from mail_io import MailIO
+from mongo_lock import MongoLock, LockTimeout
+from credential_cache import CredentialCache
+from send_queue import SendQueue
+from body_cache import BodyCache, BodyPrefetcher, message_entry
+from mail_body import extract_body
+from speech_text import speakable_address
+from transcriber import Transcriber, TranscriberBusy, StreamRegistry
+from transcriber import available as transcriber_available
+from intents import grammar_for, client_grammar
+
 # ================= SETUP =================
 load_dotenv()
 os.environ["OAUTHLIB_INSECURE_TRANSPORT"] = "1"
@@ -34,37 +47,435 @@ users_col = db["users"]
 client.admin.command("ping")
 print("✅ MongoDB connected")
 
+# ⚡ Async driver for the mail list views, on its own event loop
+# (Flask's async views need the extra:  pip install "flask[async]")
+mail_io = MailIO(
+    os.getenv("MONGO_URI"),
+    "email_app",
+    workers=int(os.getenv("MAIL_IO_WORKERS", "8")),
+    tls=True,
+    tlsCAFile=certifi.where()
+)
+
+# ================= FACE INDEX =================
+# Loaded once per process, kept current by /save_face and, for users
+# enrolled on other workers, by a (throttled) delta read when a login misses
+# FACE_INDEX_MODE=ivf switches to approximate search for large galleries
+face_index = FaceIndex(
+    mode=os.getenv("FACE_INDEX_MODE", "exact"),
+    nprobe=int(os.getenv("FACE_INDEX_NPROBE", "8"))
+)
+FACE_INDEX_SNAPSHOT = os.getenv(
+    "FACE_INDEX_SNAPSHOT",
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), "face_index_snapshot")
+)
+
+
+# created_at is stamped before insert_one, so users can land out of order;
+# delta reads look back this far (merge() skips ids already indexed)
+FACE_INDEX_DELTA_MARGIN = timedelta(seconds=int(os.getenv("FACE_INDEX_DELTA_MARGIN_SECONDS", "120")))
+FACE_FIELDS = {"face_encodings": 1, "face_centroid": 1, "face_spread": 1, "created_at": 1}
+users_col.create_index("created_at")
+
+# 🔒 One enrollment check-and-insert at a time across all workers / hosts
+face_enroll_lock = MongoLock(
+    db, "face_enroll",
+    ttl=int(os.getenv("FACE_ENROLL_LOCK_SECONDS", "30")),
+    timeout=float(os.getenv("FACE_ENROLL_LOCK_WAIT", "10"))
+)
+
+
+def merge_new_faces():
+    """Index users enrolled since the high-water mark; returns how many."""
+    query = {"face_encodings": {"$exists": True}}
+    if face_index.high_water:
+        query["created_at"] = {"$gte": face_index.high_water - FACE_INDEX_DELTA_MARGIN}
+    return face_index.merge(users_col.find(query, FACE_FIELDS))
+
+
+# A login miss catches up on other workers' enrollments at most this
+# often per worker: unknown faces retrying must not query Mongo per frame
+FACE_CATCHUP_INTERVAL = float(os.getenv("FACE_INDEX_CATCHUP_SECONDS", "2"))
+_catchup_lock = threading.Lock()
+_last_catchup = float("-inf")
+
+
+def catch_up_faces():
+    """merge_new_faces(), throttled; 0 when skipped."""
+    global _last_catchup
+    with _catchup_lock:
+        now = time.monotonic()
+        if now - _last_catchup < FACE_CATCHUP_INTERVAL:
+            return 0
+        _last_catchup = now
+    return merge_new_faces()
+
+
+def match_face(encoding):
+    user_id, _ = face_index.match(encoding, FACE_MATCH_THRESHOLD)
+    return user_id
+
+
+def load_face_index():
+    # ⚡ mmap the local snapshot, then only read users enrolled since it
+    from_snapshot = face_index.load_snapshot(FACE_INDEX_SNAPSHOT)
+    added = merge_new_faces()
+
+    if not from_snapshot or added:
+        try:
+            face_index.save_snapshot(FACE_INDEX_SNAPSHOT)
+        except OSError as e:
+            print("⚠️ Face index snapshot not saved:", e)
+
+    print(f"✅ Face index loaded ({len(face_index)} users, "
+          f"{'snapshot + ' if from_snapshot else ''}{added} from Mongo)")
+
+
+load_face_index()
+
+# ================= MAIL CACHE =================
+# Message metadata per user, refreshed with Gmail history deltas; metadata
+# fetches of more than one Gmail batch go out in parallel
+gmail_batch_pool = ThreadPoolExecutor(
+    max_workers=int(os.getenv("GMAIL_BATCH_WORKERS", "4")),
+    thread_name_prefix="gmail-batch"
+)
+mail_sync = MailSync(db, async_db=mail_io.db, executor=gmail_batch_pool)
+
+# ================= BODY CACHE =================
+BODY_MAX_BYTES = int(os.getenv("BODY_MAX_KB", "512")) * 1024
+
+# Decoded bodies for open_email / open_sent, plus read-ahead of the
+# next few inbox messages so "open email two" is answered from memory
+body_cache = BodyCache(
+    max_bytes=int(os.getenv("BODY_CACHE_MB", "32")) * 1024 * 1024
+)
+body_prefetcher = BodyPrefetcher(
+    body_cache,
+    make_service=lambda user_id: gmail_service_for(user_id),
+    extract=lambda payload: extract_body(payload, BODY_MAX_BYTES),
+    workers=int(os.getenv("PREFETCH_WORKERS", "2"))
+)
+PREFETCH_DEPTH = int(os.getenv("PREFETCH_DEPTH", "3"))
+
+
+def read_message(user_id, msg_id):
+    """Cached (or in-flight prefetched) message, else one full fetch."""
+    entry = body_prefetcher.wait(user_id, msg_id)
+    if entry is None:
+        service = gmail_service_for(user_id)
+        msg = service.users().messages().get(
+            userId="me",
+            id=msg_id,
+            format="full"
+        ).execute()
+        entry = message_entry(msg, body_prefetcher.extract)
+        body_cache.put(user_id, msg_id, entry)
+    return entry
+
+
+def prefetch_inbox(user_id, ids):
+    if PREFETCH_DEPTH > 0:
+        body_prefetcher.prefetch(user_id, ids[:PREFETCH_DEPTH])
+
+
+# ================= MAIL LIST I/O =================
+# Coroutines for the async list views, run on the mail_io loop. The Gmail
+# client is blocking, so its calls go to the mail_io threads; pymongo and
+# the pooled Gmail services are thread-safe.
+def sync_mailbox(user_id, label, headers):
+    """Bring a label's local cache up to date; returns the service used."""
+    service = gmail_service_for(user_id)
+    mail_sync.sync(user_id, service, label, headers)
+    return service
+
+
+async def load_mailbox(user_id, label, headers):
+    """
+    (user, page, error) for a list view. The user read (async driver) and
+    the Gmail history sync run concurrently, then the first page is read
+    from the mail cache. `error` is the Gmail-side exception, for the
+    caller to map to a redirect.
+    """
+    user, service = await asyncio.gather(
+        mail_io.db["users"].find_one({"_id": ObjectId(user_id)}),
+        asyncio.to_thread(sync_mailbox, user_id, label, headers),
+        return_exceptions=True
+    )
+    if isinstance(user, BaseException):
+        raise user
+    if not user or "gmail" not in user:
+        return user, None, None
+    if isinstance(service, Exception):
+        return user, None, service
+
+    page = await mail_sync.page_async(user_id, service, label, headers, MAIL_PAGE_SIZE)
+    return user, page, None
+
+
+async def load_page(user_id, label, headers, after):
+    """Next page after a cursor: cached credentials, no user read."""
+    service = await asyncio.to_thread(gmail_service_for, user_id)
+    return await mail_sync.page_async(
+        user_id, service, label, headers, MAIL_PAGE_SIZE, after=after
+    )
+
+
+# ================= MAIL LISTS =================
+MAIL_PAGE_SIZE = int(os.getenv("MAIL_PAGE_SIZE", "20"))
+
+
+def inbox_row(m):
+    return {
+        "id": m["msg_id"],          # ✅ STORE MESSAGE ID
+        "subject": m["headers"].get("Subject", ""),
+        "from": m["headers"].get("From", "")
+    }
+
+
+def sent_row(m):
+    headers = m["headers"]
+    date_raw = headers.get("Date")
+
+    date = (
+        parsedate_to_datetime(date_raw).strftime("%d %b %H:%M")
+        if date_raw else ""
+    )
+
+    return {
+        "id": m["msg_id"],
+        "to": headers.get("To") or "Unknown",
+        "subject": headers.get("Subject") or "(no subject)",
+        "date": date
+    }
+
+
+# box name in URLs -> (Gmail label, headers to cache, row builder)
+MAILBOXES = {
+    "inbox": ("INBOX", INBOX_HEADERS, inbox_row),
+    "sent": ("SENT", SENT_HEADERS, sent_row),
+}
+
+
+def next_cursor(docs, has_more):
+    return encode_cursor(docs[-1]) if docs and has_more else None
+
+
 # ================= GMAIL =================
 GMAIL_SCOPES = [
     "https://www.googleapis.com/auth/gmail.readonly",
     "https://www.googleapis.com/auth/gmail.send"
 ]
 
-def get_gmail_service(user):
-    creds = Credentials.from_authorized_user_info(
-        user["gmail"]["tokens"], GMAIL_SCOPES
+# Built services + keep-alive connections per user, reused across requests
+gmail_pool = GmailServicePool(
+    idle_ttl=int(os.getenv("GMAIL_POOL_IDLE_SECONDS", "600")),
+    max_users=int(os.getenv("GMAIL_POOL_MAX_USERS", "256")),
+    connections=int(os.getenv("GMAIL_POOL_CONNECTIONS", "4"))
+)
+
+
+def load_gmail_tokens(user_id):
+    user = users_col.find_one({"_id": ObjectId(user_id)}, {"gmail.tokens": 1})
+    return (user or {}).get("gmail", {}).get("tokens")
+
+
+def save_gmail_tokens(user_id, tokens):
+    # ✅ Save updated token back to DB (once per refresh, not per request)
+    users_col.update_one(
+        {"_id": ObjectId(user_id)},
+        {"$set": {"gmail.tokens": tokens}}
     )
 
-    # 🔁 Refresh token if expired
-    if creds.expired and creds.refresh_token:
-        try:
-            creds.refresh(Request())
 
-            # ✅ Save updated token back to DB
-            users_col.update_one(
-                {"_id": user["_id"]},
-                {"$set": {"gmail.tokens": json.loads(creds.to_json())}}
-            )
+# 🔁 Tokens cached in-process, refreshed once per user, ahead of expiry
+credential_cache = CredentialCache(
+    load_gmail_tokens,
+    save_gmail_tokens,
+    GMAIL_SCOPES,
+    margin=int(os.getenv("TOKEN_REFRESH_MARGIN_SECONDS", "300"))
+)
+credential_cache.start()
+
+
+def gmail_service_for(user_id, tokens=None):
+    """
+    Pooled Gmail service for a user id; reads Mongo only when the
+    user's credentials are not cached yet.
+    """
+    try:
+        creds = credential_cache.get(user_id, tokens)
+    except RefreshError:
+        # ❌ Token revoked → force re-auth
+        users_col.update_one(
+            {"_id": ObjectId(user_id)},
+            {"$unset": {"gmail": ""}}
+        )
+        mail_sync.forget(user_id)
+        body_cache.forget(user_id)
+        gmail_pool.drop(user_id)
+        raise Exception("GMAIL_REAUTH_REQUIRED")
+
+    if creds is None:
+        raise Exception("GMAIL_REAUTH_REQUIRED")
+
+    return gmail_pool.get(user_id, creds)
+
+
+def get_gmail_service(user):
+    return gmail_service_for(str(user["_id"]), user["gmail"]["tokens"])
+
+
+# ================= FACE ENCODING =================
+# dlib work runs in worker processes so request threads stay free
+face_encoder = FaceEncoder(
+    workers=int(os.getenv("FACE_POOL_WORKERS", "2")),
+    max_pending=int(os.getenv("FACE_POOL_MAX_PENDING", "4")),
+    timeout=float(os.getenv("FACE_POOL_TIMEOUT", "15")),
+    detect_width=int(os.getenv("FACE_DETECT_WIDTH", "320")),
+    decode_reduce=int(os.getenv("FACE_DECODE_REDUCE", "1")),
+    upsample=int(os.getenv("FACE_DETECT_UPSAMPLE", "1"))
+)
+
+# 🔥 Load and warm the dlib models in the background at boot; /ready
+# reports when the biometric path is hot
+threading.Thread(target=face_encoder.start, daemon=True).start()
+
+# Upper bound on frames accepted in one /verify_face burst
+MAX_BURST_FRAMES = int(os.getenv("FACE_MAX_BURST_FRAMES", "5"))
+
+# Resolution / quality the browser should capture frames at
+FACE_CAPTURE = {
+    "width": int(os.getenv("FACE_CAPTURE_WIDTH", "640")),
+    "quality": float(os.getenv("FACE_CAPTURE_QUALITY", "0.85")),
+    "burst": min(MAX_BURST_FRAMES, int(os.getenv("FACE_CAPTURE_BURST", "3"))),
+    "enroll_samples": min(MAX_BURST_FRAMES, int(os.getenv("FACE_ENROLL_SAMPLES", "3"))),
+    "burst_interval_ms": int(os.getenv("FACE_CAPTURE_BURST_INTERVAL_MS", "150"))
+}
+
+
+# ================= SPEECH TO TEXT =================
+# Local Whisper on CPU for browsers without the Web Speech API (Firefox)
+# or users who don't want audio sent to a cloud recognizer
+TRANSCRIBE_ENABLED = os.getenv("TRANSCRIBE_ENABLED", "1") == "1" and transcriber_available()
+
+transcriber = Transcriber(
+    model=os.getenv("TRANSCRIBE_MODEL", "base.en"),
+    workers=int(os.getenv("TRANSCRIBE_WORKERS", "1")),
+    threads=int(os.getenv("TRANSCRIBE_THREADS", "2")),
+    max_pending=int(os.getenv("TRANSCRIBE_MAX_PENDING", "4")),
+    timeout=float(os.getenv("TRANSCRIBE_TIMEOUT", "30"))
+)
+audio_streams = StreamRegistry(idle_ttl=int(os.getenv("TRANSCRIBE_IDLE_SECONDS", "60")))
+
+# Longest utterance accepted in one stream
+MAX_AUDIO_SECONDS = int(os.getenv("TRANSCRIBE_MAX_SECONDS", "60"))
+
+# Commands are short: re-run on every chunk so the match is seen early
+COMMAND_MIN_NEW_SECONDS = float(os.getenv("TRANSCRIBE_COMMAND_MIN_NEW", "0.5"))
+
+# 🔥 Model loaded once per worker, in the background at boot
+if TRANSCRIBE_ENABLED:
+    threading.Thread(target=transcriber.start, daemon=True).start()
+
+
+@app.context_processor
+def voice_grammar_helper():
+    # 🎤 Pages embed their compiled command tries; Web Speech results
+    # are matched in the browser (voice_intents.js)
+    return {"voice_grammar": client_grammar}
+
+
+FRAME_MIMETYPES = ("image/jpeg", "image/png", "application/octet-stream")
 
-        except RefreshError:
-            # ❌ Token revoked → force re-auth
-            users_col.update_one(
-                {"_id": user["_id"]},
-                {"$unset": {"gmail": ""}}
-            )
-            raise Exception("GMAIL_REAUTH_REQUIRED")
 
-    return build("gmail", "v1", credentials=creds)
+def decode_data_url(image):
+    return base64.b64decode(image.split(",")[1])
+
+
+def read_frame():
+    """
+    Uploaded frame bytes from a raw image body, a multipart `image` file,
+    or (legacy) a JSON data URL. Returns None when nothing was sent.
+    """
+    if request.mimetype in FRAME_MIMETYPES:
+        return request.get_data(cache=False) or None
+
+    if "image" in request.files:
+        return request.files["image"].read() or None
+
+    image = (request.get_json(silent=True) or {}).get("image")
+    return decode_data_url(image) if image else None
+
+
+def read_frames():
+    """
+    Burst upload: every multipart `frames` file, or a JSON `images` list of
+    data URLs. Falls back to the single-frame formats of read_frame().
+    """
+    files = request.files.getlist("frames")
+    if files:
+        return [data for data in (f.read() for f in files) if data]
+
+    if request.is_json:
+        images = (request.get_json(silent=True) or {}).get("images")
+        if images:
+            return [decode_data_url(image) for image in images[:MAX_BURST_FRAMES]]
+
+    frame = read_frame()
+    return [frame] if frame else []
+
+
+def match_frames(frames, average=False):
+    """
+    Encode a burst in parallel and stop at the first frame that matches.
+    With `average`, frames that didn't match on their own are averaged
+    into one embedding and tried once more (helps in poor lighting).
+    If nothing matched, the index catches up once (catch_up_faces) and
+    the burst's faces are tried again.
+    Returns (user_id, faces_found, per-frame timings).
+    """
+    live = []
+    timings = []
+
+    burst = face_encoder.encode_burst(frames[:MAX_BURST_FRAMES])
+    try:
+        for encodings, t in burst:
+            timings.append(t)
+            if not encodings:
+                continue
+
+            live.append(encodings[0])
+            user_id = match_face(encodings[0])
+            if user_id:
+                return user_id, len(live), timings
+    finally:
+        burst.close()
+
+    probes = list(live)
+    if average and len(live) > 1:
+        probes.append(np.mean(live, axis=0))
+        user_id = match_face(probes[-1])
+        if user_id:
+            return user_id, len(live), timings
+
+    # 🔄 No match: maybe enrolled on another worker. One catch-up for the
+    # whole burst (throttled), then the same faces once more
+    if probes and catch_up_faces():
+        for encoding in probes:
+            user_id = match_face(encoding)
+            if user_id:
+                return user_id, len(live), timings
+
+    return None, len(live), timings
+
+
+def busy_response(timings=None, **extra):
+    # ⏳ Backpressure: tell the client to retry instead of queueing forever
+    resp = jsonify({"status": "busy", "retry_after": 1, "timings": timings or {}, **extra})
+    resp.status_code = 503
+    resp.headers["Retry-After"] = "1"
+    return resp
 
 
 # ================= ROUTES =================
@@ -75,36 +486,58 @@ def home():
     return render_template("biometric.html")
 
 
+# ---------- READINESS (load balancer probe) ----------
+@app.route("/ready")
+def ready():
+    body = {
+        "status": "ready" if face_encoder.ready else "warming",
+        "warm_workers": face_encoder.warm_workers,
+        "workers": face_encoder.workers,
+        "face_index": len(face_index),
+        "transcriber": (
+            ("ready" if transcriber.ready else "warming") if TRANSCRIBE_ENABLED else "disabled"
+        )
+    }
+    return jsonify(body), 200 if face_encoder.ready else 503
+
+
+# ---------- FACE CAPTURE SETTINGS ----------
+@app.route("/face_config")
+def face_config():
+    return jsonify(FACE_CAPTURE)
+
+
 # ---------- VERIFY FACE (LOGIN) ----------
 @app.route("/verify_face", methods=["POST"])
 def verify_face():
-    image = request.json.get("image")
-    if not image:
+    started = time.perf_counter()
+
+    frames = read_frames()
+    if not frames:
         return jsonify({"status": "fail"})
 
-    img = cv2.imdecode(
-        np.frombuffer(base64.b64decode(image.split(",")[1]), np.uint8),
-        cv2.IMREAD_COLOR
-    )
+    payload = request.get_json(silent=True) if request.is_json else None
+    average = request.values.get("average") == "1" or bool((payload or {}).get("average"))
 
-    live = face_recognition.face_encodings(
-        cv2.cvtColor(img, cv2.COLOR_BGR2RGB)
-    )
-    if not live:
-        return jsonify({"status": "fail"})
+    try:
+        user_id, found, frame_timings = match_frames(frames, average)
+    except FacePoolBusy:
+        return busy_response()
 
-    live = live[0]
+    timings = {
+        "frames": frame_timings,
+        "total_ms": round((time.perf_counter() - started) * 1000, 1)
+    }
 
-    for user in users_col.find({"face_encodings": {"$exists": True}}):
-        known = np.array(user["face_encodings"][0])
-        dist = face_recognition.face_distance([known], live)[0]
+    if user_id:
+        session["user_id"] = user_id
+        session["biometric_verified"] = True
+        return jsonify({"status": "success", "timings": timings})
 
-        if dist < 0.45:
-            session["user_id"] = str(user["_id"])
-            session["biometric_verified"] = True
-            return jsonify({"status": "success"})
+    if not found:
+        return jsonify({"status": "fail", "timings": timings})
 
-    return jsonify({"status": "not_found"})
+    return jsonify({"status": "not_found", "timings": timings})
 
 
 # ---------- REGISTER FACE PAGE ----------
@@ -116,33 +549,62 @@ def register_face():
 # ---------- SAVE FACE ----------
 @app.route("/save_face", methods=["POST"])
 def save_face():
-    image = request.json.get("image")
-    if not image:
-        return jsonify({"status": "fail"})
-
-    img = cv2.imdecode(
-        np.frombuffer(base64.b64decode(image.split(",")[1]), np.uint8),
-        cv2.IMREAD_COLOR
-    )
+    started = time.perf_counter()
 
-    enc = face_recognition.face_encodings(
-        cv2.cvtColor(img, cv2.COLOR_BGR2RGB)
-    )
-    if not enc:
+    frames = read_frames()
+    if not frames:
         return jsonify({"status": "fail"})
 
-    # Prevent duplicate registration
-    for u in users_col.find({"face_encodings": {"$exists": True}}):
-        known = np.array(u["face_encodings"][0])
-        if face_recognition.face_distance([known], enc[0])[0] < 0.45:
-            return jsonify({"status": "already_registered"})
+    # 📸 Every frame of the enrollment burst becomes a sample
+    encodings = []
+    frame_timings = []
+    try:
+        for enc, t in face_encoder.encode_burst(frames[:MAX_BURST_FRAMES]):
+            frame_timings.append(t)
+            if enc:
+                encodings.append(enc[0])
+    except FacePoolBusy:
+        return busy_response()
+
+    timings = {"frames": frame_timings}
+    if not encodings:
+        return jsonify({"status": "fail", "timings": timings})
+
+    centroid, samples, spread = face_profile(encodings)
+    if len(samples) > 2:
+        # Drop stray samples (someone walking past, bad detection)
+        keep = np.linalg.norm(samples - centroid, axis=1) < FACE_MATCH_THRESHOLD
+        if keep.any():
+            centroid, samples, spread = face_profile(samples[keep])
+
+    created_at = datetime.utcnow()
+
+    def insert_user():
+        return users_col.insert_one({
+            "face_encodings": samples.tolist(),
+            "face_centroid": centroid.tolist(),
+            "face_spread": spread,
+            "created_at": created_at
+        }).inserted_id
+
+    # 🔒 Duplicate check + insert as one step (same index as login), under
+    # the cross-worker lease; the check first catches up on users enrolled
+    # by other workers
+    try:
+        _, created = face_index.match_or_add(
+            centroid, insert_user, FACE_MATCH_THRESHOLD,
+            samples=samples, spread=spread,
+            created_at=created_at, refresh=merge_new_faces,
+            guard=face_enroll_lock.hold()
+        )
+    except LockTimeout:
+        return busy_response()
+    timings["total_ms"] = round((time.perf_counter() - started) * 1000, 1)
 
-    users_col.insert_one({
-        "face_encodings": [enc[0].tolist()],
-        "created_at": datetime.utcnow()
-    })
+    if not created:
+        return jsonify({"status": "already_registered", "timings": timings})
 
-    return jsonify({"status": "registered"})
+    return jsonify({"status": "registered", "timings": timings})
 
 
 # ---------- DASHBOARD -------
@@ -229,7 +691,13 @@ def gmail_callback():
 
     creds = flow.credentials
 
-    gmail_service = build("gmail", "v1", credentials=creds)
+    # 🧹 Possibly a different mailbox now: start the local cache fresh
+    gmail_pool.drop(session["user_id"])
+    credential_cache.forget(session["user_id"])
+    mail_sync.forget(session["user_id"])
+    body_cache.forget(session["user_id"])
+
+    gmail_service = gmail_pool.get(session["user_id"], creds)
     profile = gmail_service.users().getProfile(userId="me").execute()
     email = profile["emailAddress"]
 
@@ -249,7 +717,7 @@ def gmail_callback():
 
 # ---------- GMAIL INBOX ----------
 @app.route("/gmail_inbox")
-def gmail_inbox():
+async def gmail_inbox():
     if not session.get("biometric_verified"):
         return redirect("/")
 
@@ -257,128 +725,142 @@ def gmail_inbox():
     if not user_id:
         return redirect("/")
 
-    user = users_col.find_one({"_id": ObjectId(user_id)})
+    # ⚡ Served from the local cache; a refresh is one history call,
+    # running alongside the user lookup
+    user, page, error = await mail_io.run(load_mailbox(user_id, "INBOX", INBOX_HEADERS))
     if not user or "gmail" not in user:
         return redirect("/dashboard")
 
-    try:
-        service = get_gmail_service(user)
-    except Exception as e:
-        if "GMAIL_REAUTH_REQUIRED" in str(e):
+    if error:
+        if "GMAIL_REAUTH_REQUIRED" in str(error):
             return redirect("/gmail_auth")
-        raise e
-
-
-    results = service.users().messages().list(
-        userId="me",
-        maxResults=20,
-        labelIds=["INBOX"]
-    ).execute()
-
-    emails = []
-    for msg in results.get("messages", []):
-        data = service.users().messages().get(
-            userId="me",
-            id=msg["id"],
-            format="metadata"
-        ).execute()
-
-        headers = data["payload"]["headers"]
-        subject = next((h["value"] for h in headers if h["name"] == "Subject"), "")
-        sender = next((h["value"] for h in headers if h["name"] == "From"), "")
+        raise error
 
-        emails.append({
-            "id": msg["id"],          # ✅ STORE MESSAGE ID
-            "subject": subject,
-            "from": sender
-        })
+    docs, has_more = page
+    emails = [inbox_row(m) for m in docs]
 
+    # 🍪 Rows link to /open_email/<message id>: no list kept in the cookie
+    # (dropped from sessions that still carry one) or anywhere else
+    session.pop("cached_emails", None)
+    prefetch_inbox(user_id, [e["id"] for e in emails])
+    return render_template(
+        "gmail.html",
+        emails=emails,
+        user=user,
+        next_cursor=next_cursor(docs, has_more)
+    )
 
-    session["cached_emails"] = emails
-    return render_template("gmail.html", emails=emails, user=user)
-
-def decode_base64(data):
-    return base64.urlsafe_b64decode(data).decode("utf-8", errors="ignore")
-
-def extract_body(payload):
-    html_body = None
-    text_body = None
-
-    def walk(part):
-        nonlocal html_body, text_body
-
-        mime = part.get("mimeType", "")
-        body = part.get("body", {}).get("data")
-
-        if body:
-            decoded = decode_base64(body)
-
-            if mime == "text/html":
-                html_body = decoded
-
-            elif mime == "text/plain" and not text_body:
-                text_body = decoded
+# ---------- OPEN EMAIL ----------
+@app.route("/open_email/<msg_id>")
+def open_email(msg_id):
+    user_id = session.get("user_id")
+    if not user_id:
+        return redirect("/")
 
-        for p in part.get("parts", []):
-            walk(p)
+    # ⚡ Usually already prefetched; then no Gmail call at all
+    try:
+        entry = read_message(user_id, msg_id)
+    except Exception as e:
+        if "GMAIL_REAUTH_REQUIRED" in str(e):
+            return redirect("/gmail_auth")
+        raise e
+    # 📖 Read ahead the rows below this one (mail cache order = list order)
+    prefetch_inbox(user_id, mail_sync.following(user_id, "INBOX", msg_id, PREFETCH_DEPTH))
 
-    walk(payload)
+    subject = entry["headers"]["Subject"]
+    sender = entry["headers"]["From"]
+    body = entry["body"]
 
-    # Prefer HTML
-    if html_body:
-        return html_body
+    # ✅ FIXED: extract threadId
+    thread_id = entry["thread_id"]
 
-    if text_body:
-        return f"<pre>{text_body}</pre>"
+    # 🔊 Pre-split, cleaned text for the voice reader
+    speech = [f"Subject {subject}.", f"From {speakable_address(sender)}."] + entry["speech"]
 
-    return "No content found"
+    return render_template(
+        "read_email.html",
+        subject=subject,
+        sender=sender,
+        body=body,
+        speech=speech,
+        message_id=msg_id,      # ✅ NOW DEFINED
+        thread_id=thread_id     # ✅ NOW DEFINED
+    )
 
 
 
 
+from email.mime.text import MIMEText
+import base64
 
-# ---------- OPEN EMAIL ----------
-@app.route("/open_email/<int:index>")
-def open_email(index):
-    if "cached_emails" not in session:
-        return redirect("/gmail_inbox")
+# ================= SEND QUEUE =================
+def deliver_mail(job):
+    """Outbox worker: build the MIME mail and hand it to Gmail."""
+    mail = job["mail"]
+    service = gmail_service_for(job["user_id"])
+
+    # ✉️ Create email
+    message = MIMEText(mail["body"])
+    message["To"] = mail["to"]
+    message["Subject"] = mail["subject"]
+    body = {}
+
+    if mail.get("reply_to"):
+        # 🔍 Original's headers came from the cache at enqueue time; only
+        # fetched here if the mail was never listed or opened
+        original = mail.get("original") or fetch_reply_headers(service, mail["reply_to"])
+
+        subject = original["Subject"]
+        if not subject.lower().startswith("re:"):
+            subject = "Re: " + subject
+        message.replace_header("Subject", subject)
+        message.replace_header("To", original["Reply-To"] or original["From"])
+
+        # 🧵 RFC 5322 threading uses Message-IDs, not Gmail ids
+        if original["Message-ID"]:
+            message["In-Reply-To"] = original["Message-ID"]
+            message["References"] = " ".join(
+                filter(None, [original["References"], original["Message-ID"]])
+            )
 
-    user = users_col.find_one({"_id": ObjectId(session["user_id"])})
-    service = get_gmail_service(user)
+        # 📤 Send reply in SAME THREAD
+        body["threadId"] = mail["thread_id"]
 
-    mail = session["cached_emails"][index]
-    msg_id = mail["id"]
+    body["raw"] = base64.urlsafe_b64encode(
+        message.as_bytes()
+    ).decode()
 
-    msg = service.users().messages().get(
+    # 📤 Send via Gmail API
+    sent = service.users().messages().send(
         userId="me",
-        id=msg_id,
-        format="full"
+        body=body
     ).execute()
+    return sent.get("id")
 
-    headers = msg["payload"]["headers"]
-    subject = next((h["value"] for h in headers if h["name"] == "Subject"), "")
-    sender = next((h["value"] for h in headers if h["name"] == "From"), "")
 
-    body = extract_body(msg["payload"])
+# 📮 Mail is stored in Mongo and sent by background workers with retries
+send_queue = SendQueue(
+    db,
+    deliver_mail,
+    workers=int(os.getenv("SEND_WORKERS", "2")),
+    max_attempts=int(os.getenv("SEND_MAX_ATTEMPTS", "6"))
+)
+send_queue.start()
 
-    # ✅ FIXED: extract threadId
-    thread_id = msg["threadId"]
 
-    return render_template(
-        "read_email.html",
-        subject=subject,
-        sender=sender,
-        body=body,
-        message_id=msg_id,      # ✅ NOW DEFINED
-        thread_id=thread_id     # ✅ NOW DEFINED
+def idempotency_key(data):
+    # Same key from the client (a retried POST) -> same outbox job
+    return (
+        request.headers.get("Idempotency-Key")
+        or data.get("idempotency_key")
+        or uuid.uuid4().hex
     )
 
 
+def queued_response(job):
+    return jsonify({"status": "queued", "job_id": str(job["_id"])})
 
 
-from email.mime.text import MIMEText
-import base64
-
 @app.route("/send_mail", methods=["POST"])
 def send_mail():
     if not session.get("biometric_verified"):
@@ -396,29 +878,32 @@ def send_mail():
     if not to or not body:
         return jsonify({"status": "missing_fields"})
 
-    try:
-        service = get_gmail_service(user)
-
-        # ✉️ Create email
-        message = MIMEText(body)
-        message["To"] = to
-        message["Subject"] = subject
-
-        raw = base64.urlsafe_b64encode(
-            message.as_bytes()
-        ).decode()
+    # ⚡ Acknowledge once stored; /send_status reports delivery
+    job = send_queue.enqueue(
+        session["user_id"],
+        idempotency_key(data),
+        {"to": to, "subject": subject, "body": body}
+    )
+    return queued_response(job)
 
-        # 📤 Send via Gmail API
-        service.users().messages().send(
-            userId="me",
-            body={"raw": raw}
-        ).execute()
 
-        return jsonify({"status": "success"})
+@app.route("/send_status/<job_id>")
+def send_status(job_id):
+    if not session.get("biometric_verified"):
+        return jsonify({"status": "unauthorized"}), 401
 
-    except Exception as e:
-        print("❌ SEND MAIL ERROR:", e)
-        return jsonify({"status": "error"})
+    try:
+        job = send_queue.status(session["user_id"], ObjectId(job_id))
+    except Exception:
+        job = None
+    if job is None:
+        return jsonify({"status": "not_found"}), 404
+
+    return jsonify({
+        "status": job["status"],
+        "attempts": job["attempts"],
+        "error": job.get("error")
+    })
 
 # ---------- COMPOSE MAIL ----------
 @app.route("/compose")
@@ -453,90 +938,86 @@ def open_sent(msg_id):
     if not session.get("biometric_verified"):
         return redirect("/")
 
-    user = users_col.find_one({"_id": ObjectId(session["user_id"])})
-    service = get_gmail_service(user)
-
-    msg = service.users().messages().get(
-        userId="me",
-        id=msg_id,
-        format="full"
-    ).execute()
+    try:
+        entry = read_message(session["user_id"], msg_id)
+    except Exception as e:
+        if "GMAIL_REAUTH_REQUIRED" in str(e):
+            return redirect("/gmail_auth")
+        raise e
 
-    headers = msg["payload"]["headers"]
+    subject = entry["headers"]["Subject"]
+    to = entry["headers"]["To"]
 
-    subject = next((h["value"] for h in headers if h["name"] == "Subject"), "")
-    to = next((h["value"] for h in headers if h["name"] == "To"), "")
+    body = entry["body"]
 
-    body = extract_body(msg["payload"])
+    speech = [f"Subject {subject}.", f"To {speakable_address(to)}."] + entry["speech"]
 
     return render_template(
     "read_email.html",
     subject=subject,
     sender=f"To: {to}",
-    body=body
+    body=body,
+    speech=speech
 )
 
 
 
 
 @app.route("/gmail_sent")
-def gmail_sent():
+async def gmail_sent():
     if not session.get("biometric_verified"):
         return redirect("/")
 
-    user = users_col.find_one({"_id": ObjectId(session["user_id"])})
+    # ⚡ Headers only, from the local cache; full bodies are fetched by open_sent
+    user_id = session["user_id"]
+    user, page, error = await mail_io.run(load_mailbox(user_id, "SENT", SENT_HEADERS))
     if not user or "gmail" not in user:
         return redirect("/dashboard")
 
-    service = get_gmail_service(user)
-
-    results = service.users().messages().list(
-        userId="me",
-        maxResults=20,
-        labelIds=["SENT"]
-    ).execute()
-
-    def find_header(payload, name):
-        """Recursively search headers in payload + parts"""
-        for h in payload.get("headers", []):
-            if h["name"].lower() == name.lower():
-                return h["value"]
-
-        for part in payload.get("parts", []):
-            val = find_header(part, name)
-            if val:
-                return val
+    if error:
+        if "GMAIL_REAUTH_REQUIRED" in str(error):
+            return redirect("/gmail_auth")
+        raise error
 
-        return ""
+    docs, has_more = page
 
-    emails = []
+    return render_template(
+        "sent.html",
+        emails=[sent_row(m) for m in docs],
+        next_cursor=next_cursor(docs, has_more)
+    )
 
-    for msg in results.get("messages", []):
-        data = service.users().messages().get(
-            userId="me",
-            id=msg["id"],
-            format="full"
-        ).execute()
 
-        payload = data.get("payload", {})
+# ---------- MORE MAIL (pagination) ----------
+@app.route("/gmail_page/<box>")
+async def gmail_page(box):
+    if not session.get("biometric_verified"):
+        return jsonify({"status": "unauthorized"}), 401
 
-        subject = find_header(payload, "Subject") or "(no subject)"
-        to = find_header(payload, "To")            # ✅ THIS NOW WORKS
-        date_raw = find_header(payload, "Date")
+    if box not in MAILBOXES:
+        return jsonify({"status": "unknown_box"}), 404
 
-        date = (
-            parsedate_to_datetime(date_raw).strftime("%d %b %H:%M")
-            if date_raw else ""
-        )
+    after = decode_cursor(request.args.get("cursor"))
+    if after is None:
+        return jsonify({"status": "bad_cursor"}), 400
 
-        emails.append({
-            "id": msg["id"],
-            "to": to or "Unknown",
-            "subject": subject,
-            "date": date
-        })
+    user_id = session.get("user_id")
+    if not user_id:
+        return jsonify({"status": "unauthorized"}), 401
 
-    return render_template("sent.html", emails=emails)
+    # Cached credentials: no Mongo user read per page
+    label, headers, row = MAILBOXES[box]
+    try:
+        docs, has_more = await mail_io.run(load_page(user_id, label, headers, after))
+    except Exception as e:
+        if "GMAIL_REAUTH_REQUIRED" in str(e):
+            return jsonify({"status": "gmail_not_connected"}), 401
+        raise e
+    return jsonify({
+        "status": "success",
+        "emails": [row(m) for m in docs],
+        "next_cursor": next_cursor(docs, has_more)
+    })
 
 
 
@@ -545,62 +1026,116 @@ def reply_mail():
     if not session.get("biometric_verified"):
         return jsonify({"status": "unauthorized"})
 
-    user = users_col.find_one({"_id": ObjectId(session["user_id"])})
-    service = get_gmail_service(user)
-
     data = request.json
     reply_text = data["message"]
     message_id = data["message_id"]
     thread_id = data["thread_id"]
 
-    # 🔍 Fetch original mail metadata
-    original = service.users().messages().get(
-        userId="me",
-        id=message_id,
-        format="metadata",
-        metadataHeaders=["Subject", "From"]
-    ).execute()
-
-    headers = original["payload"]["headers"]
-    subject = ""
-    to_email = ""
-
-    for h in headers:
-        if h["name"] == "Subject":
-            subject = h["value"]
-        if h["name"] == "From":
-            to_email = h["value"]
-
-    # ✉️ Build reply
-    mime = MIMEText(reply_text)
-    mime["To"] = to_email
-    mime["Subject"] = "Re: " + subject
-    mime["In-Reply-To"] = message_id
-    mime["References"] = message_id
-
-    raw = base64.urlsafe_b64encode(
-        mime.as_bytes()
-    ).decode()
+    # ✉️ Subject / recipient / threading from the original: cached by
+    # open_email (body cache) or gmail_inbox (mail cache)
+    user_id = session["user_id"]
+    entry = body_cache.get(user_id, message_id)
+    original = reply_headers(entry["headers"] if entry else None) \
+        or reply_headers(mail_sync.headers(user_id, "INBOX", message_id))
 
-    # 📤 Send reply in SAME THREAD
-    service.users().messages().send(
-        userId="me",
-        body={
-            "raw": raw,
-            "threadId": thread_id
+    job = send_queue.enqueue(
+        user_id,
+        idempotency_key(data),
+        {
+            "to": "",
+            "subject": "",
+            "body": reply_text,
+            "reply_to": message_id,
+            "thread_id": thread_id,
+            "original": original
         }
-    ).execute()
+    )
+    return queued_response(job)
+
+
+# ---------- SPEECH TO TEXT ----------
+@app.route("/transcribe", methods=["POST"])
+def transcribe():
+    """
+    One chunk of an utterance per request (raw body: audio/webm;codecs=opus
+    from MediaRecorder, or audio/l16;rate=N PCM). ?stream=<id> ties the
+    chunks together; ?final=1 on the last one. Each response carries the
+    transcript so far, so partial results arrive while the user speaks.
+
+    ?grammar=<page> (&reading=1) means a voice command is expected: Whisper
+    is held to that page's command vocabulary, and the utterance ends as
+    soon as a complete command is heard followed by a short pause, without
+    waiting for the client's silence timeout.
+    """
+    if not session.get("biometric_verified"):
+        return jsonify({"status": "unauthorized"}), 401
+
+    if not TRANSCRIBE_ENABLED:
+        return jsonify({"status": "unavailable"}), 501
 
-    return jsonify({"status": "success"})
+    stream_id = f"{session['user_id']}:{request.args.get('stream', '')}"
+    final = request.args.get("final") == "1"
+    grammar = grammar_for(request.args.get("grammar", ""), request.args.get("reading") == "1")
+    command = None
+
+    try:
+        stream = audio_streams.get(stream_id, request.content_type or "audio/webm")
+    except TranscriberBusy:
+        # Nothing stored: the client resends this same chunk
+        return busy_response(stored=False)
+    except ValueError as e:
+        # ❌ e.g. audio/l16;rate=0
+        return jsonify({"status": "bad_audio", "error": str(e)}), 400
+
+    with stream.lock:
+        chunk = request.get_data(cache=False)
+        if chunk:
+            stream.append(chunk)
+
+        if stream.seconds > MAX_AUDIO_SECONDS:
+            final = True
+
+        try:
+            if grammar is None:
+                timings = stream.update(transcriber, final)
+            else:
+                timings = stream.update(
+                    transcriber, final, min_new=COMMAND_MIN_NEW_SECONDS, grammar=grammar
+                )
+        except TranscriberBusy:
+            # The chunk is kept: a partial just waits for the next pass,
+            # a final is retried by the client with an empty body
+            if final:
+                return busy_response(stored=True)
+            timings = None
+
+        text = stream.text()
+        if grammar is not None:
+            command = grammar.match(text)
+            # ⚡ Whole command heard and the speaker paused: done
+            if command and command["complete"] and stream.trailing_silence():
+                final = True
+
+    if final:
+        audio_streams.drop(stream_id)
+
+    return jsonify({
+        "status": "final" if final else "partial",
+        "text": text,
+        "command": command,
+        "timings": timings or {}
+    })
 
 
 # ---------- LOGOUT ----------
 @app.route("/logout")
 def logout():
+    if session.get("user_id"):
+        body_cache.forget(session["user_id"])
     session.clear()
     return redirect("/")
 
 
 # ================= RUN =================
 if __name__ == "__main__":
-    app.run(debug=True, use_reloader=False)
+    app.run(debug=True, use_reloader=False, threaded=True)
@@ -0,0 +1,97 @@
+"""
+Face matching benchmark: legacy per-user loop vs FaceIndex (exact / ivf).
+
+Uses synthetic 128-d embeddings shaped like face_recognition output
+(enrolled faces ~0.9 apart, live captures ~0.3 from their enrollment), so
+no camera, dlib or Mongo is needed.
+
+    python benchmarks/bench_face_index.py --users 100000 --queries 200
+"""
+import argparse
+import os
+import sys
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from face_index import FaceIndex, FACE_MATCH_THRESHOLD, EMBEDDING_DIM  # noqa: E402
+
+
+def make_gallery(n, rng, groups=64):
+    # Faces cluster loosely (lighting / demographics), which is what IVF exploits
+    centers = rng.normal(0, 0.045, size=(groups, EMBEDDING_DIM))
+    labels = rng.integers(0, groups, size=n)
+    return (centers[labels] + rng.normal(0, 0.04, size=(n, EMBEDDING_DIM))).astype(np.float32)
+
+
+def make_queries(gallery, count, rng, impostor_ratio=0.2):
+    picks = rng.integers(0, len(gallery), size=count)
+    queries = gallery[picks] + rng.normal(0, 0.026, size=(count, EMBEDDING_DIM))
+
+    # Some queries belong to nobody (should come back not_found)
+    impostors = rng.random(count) < impostor_ratio
+    queries[impostors] = make_gallery(int(impostors.sum()), rng)
+    return queries.astype(np.float32)
+
+
+def legacy_match(gallery, live):
+    # What verify_face did before the index: one distance call per user
+    for i, known in enumerate(gallery):
+        if np.linalg.norm(np.array([known]) - live, axis=1)[0] < FACE_MATCH_THRESHOLD:
+            return i
+    return None
+
+
+def timed(fn, queries):
+    out = []
+    start = time.perf_counter()
+    for q in queries:
+        out.append(fn(q))
+    elapsed = time.perf_counter() - start
+    return out, elapsed / len(queries) * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--users", type=int, default=50000)
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--nprobe", type=int, nargs="+", default=[4, 8, 16])
+    parser.add_argument("--legacy-queries", type=int, default=20,
+                        help="the per-user loop is slow; time it on fewer queries")
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(0)
+    gallery = make_gallery(args.users, rng)
+    queries = make_queries(gallery, args.queries, rng)
+    users = [{"_id": i, "face_encodings": [row]} for i, row in enumerate(gallery)]
+
+    exact = FaceIndex(mode="exact")
+    exact.load(users)
+    truth, exact_ms = timed(lambda q: exact.match(q)[0], queries)
+
+    _, legacy_ms = timed(lambda q: legacy_match(gallery, q), queries[:args.legacy_queries])
+
+    print(f"users={args.users} queries={args.queries}")
+    print(f"{'backend':<16}{'ms/query':>10}{'recall':>10}")
+    print(f"{'legacy loop':<16}{legacy_ms:>10.3f}{'-':>10}")
+    print(f"{'exact':<16}{exact_ms:>10.3f}{1.0:>10.3f}")
+
+    for nprobe in args.nprobe:
+        ivf = FaceIndex(mode="ivf", nprobe=nprobe)
+        ivf.load(users)
+
+        build = time.perf_counter()
+        ivf.train_partition()   # waits for the background training load() started
+        build_ms = (time.perf_counter() - build) * 1000
+
+        found, ivf_ms = timed(lambda q: ivf.match(q)[0], queries)
+        # Only genuine queries count: both missing an impostor is not a hit
+        hits = [a == b for a, b in zip(found, truth) if b is not None]
+        recall = np.mean(hits) if hits else float("nan")
+        print(f"{'ivf nprobe=' + str(nprobe):<16}{ivf_ms:>10.3f}{recall:>10.3f}"
+              f"   (train {build_ms:.0f} ms)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,117 @@
+"""
+Frame preprocessing benchmark: latency vs accuracy per capture / detect scale.
+
+Point it at a folder of face photos laid out one sub-folder per person
+(e.g. an LFW subset):
+
+    python benchmarks/bench_face_pipeline.py faces/ --capture 1280 640 480 --detect 0 480 320 240
+
+For every (capture width, decode reduction, detect width) combination it
+re-encodes each photo the way the browser would, runs encode_frame() and
+reports mean latency, detection rate, drift from the full-resolution
+embedding, and genuine-accept / impostor-reject rates at 0.45.
+"""
+import argparse
+import itertools
+import os
+import sys
+import time
+
+import cv2
+import numpy as np
+import face_recognition
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from face_index import FACE_MATCH_THRESHOLD  # noqa: E402
+from face_pipeline import encode_frame  # noqa: E402
+
+
+def load_photos(root):
+    photos = []
+    for person in sorted(os.listdir(root)):
+        folder = os.path.join(root, person)
+        if not os.path.isdir(folder):
+            continue
+        for name in sorted(os.listdir(folder)):
+            img = cv2.imread(os.path.join(folder, name))
+            if img is not None:
+                photos.append((person, img))
+    return photos
+
+
+def as_upload(img, width, quality):
+    # Same resize + JPEG step as captureFrame() in the browser
+    h, w = img.shape[:2]
+    if width and w > width:
+        img = cv2.resize(img, (width, int(h * width / w)), interpolation=cv2.INTER_AREA)
+    ok, buf = cv2.imencode(".jpg", img, [cv2.IMWRITE_JPEG_QUALITY, int(quality * 100)])
+    return buf.tobytes()
+
+
+def legacy_encode(data):
+    # verify_face before preprocessing: full decode + detection on full frame
+    img = cv2.imdecode(np.frombuffer(data, np.uint8), cv2.IMREAD_COLOR)
+    return face_recognition.face_encodings(cv2.cvtColor(img, cv2.COLOR_BGR2RGB))
+
+
+def verification_rates(people, encodings):
+    genuine, impostor = [], []
+    for (pa, ea), (pb, eb) in itertools.combinations(zip(people, encodings), 2):
+        if ea is None or eb is None:
+            continue
+        accepted = np.linalg.norm(ea - eb) < FACE_MATCH_THRESHOLD
+        (genuine if pa == pb else impostor).append(accepted)
+    gar = np.mean(genuine) if genuine else float("nan")
+    irr = 1 - np.mean(impostor) if impostor else float("nan")
+    return gar, irr
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("folder")
+    parser.add_argument("--capture", type=int, nargs="+", default=[0, 640, 480])
+    parser.add_argument("--reduce", type=int, nargs="+", default=[1, 2])
+    parser.add_argument("--detect", type=int, nargs="+", default=[0, 320, 240])
+    parser.add_argument("--quality", type=float, default=0.85)
+    args = parser.parse_args()
+
+    photos = load_photos(args.folder)
+    if not photos:
+        sys.exit("no photos found")
+    people = [p for p, _ in photos]
+
+    # Reference: today's full-resolution path
+    reference = []
+    start = time.perf_counter()
+    for _, img in photos:
+        enc = legacy_encode(as_upload(img, 0, 0.92))
+        reference.append(enc[0] if enc else None)
+    legacy_ms = (time.perf_counter() - start) / len(photos) * 1000
+    gar, irr = verification_rates(people, reference)
+
+    print(f"{len(photos)} photos, {len(set(people))} people")
+    print(f"{'capture':>8}{'reduce':>8}{'detect':>8}{'ms':>9}{'found':>8}{'drift':>8}{'GAR':>7}{'IRR':>7}")
+    print(f"{'legacy':>8}{'-':>8}{'-':>8}{legacy_ms:>9.1f}"
+          f"{np.mean([r is not None for r in reference]):>8.2f}{0.0:>8.3f}{gar:>7.2f}{irr:>7.2f}")
+
+    for capture, reduce, detect in itertools.product(args.capture, args.reduce, args.detect):
+        uploads = [as_upload(img, capture, args.quality) for _, img in photos]
+
+        encodings = []
+        start = time.perf_counter()
+        for data in uploads:
+            enc, _ = encode_frame(data, detect_width=detect, decode_reduce=reduce)
+            encodings.append(enc[0] if enc else None)
+        ms = (time.perf_counter() - start) / len(uploads) * 1000
+
+        drift = [np.linalg.norm(e - r) for e, r in zip(encodings, reference)
+                 if e is not None and r is not None]
+        found = np.mean([e is not None for e in encodings])
+        gar, irr = verification_rates(people, encodings)
+
+        print(f"{capture or 'full':>8}{reduce:>8}{detect or 'full':>8}{ms:>9.1f}"
+              f"{found:>8.2f}{np.mean(drift) if drift else float('nan'):>8.3f}{gar:>7.2f}{irr:>7.2f}")
+
+
+if __name__ == "__main__":
+    main()
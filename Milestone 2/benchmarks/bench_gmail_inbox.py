@@ -0,0 +1,62 @@
+"""
+Inbox metadata fetch benchmark against a local fake Gmail server.
+
+Compares the old per-message messages.get loop with gmail_client.batch_get
+at a simulated API latency:
+
+    python benchmarks/bench_gmail_inbox.py --latency 0.08 --count 20
+"""
+import argparse
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from gmail_client import batch_get, INBOX_HEADERS  # noqa: E402
+from fake_gmail import FakeGmail  # noqa: E402
+
+
+def sequential(service, ids):
+    # gmail_inbox before batching: one round trip per message
+    return [
+        service.users().messages().get(userId="me", id=i, format="metadata").execute()
+        for i in ids
+    ]
+
+
+def batched(service, ids):
+    return batch_get(service, ids, headers=INBOX_HEADERS)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--latency", type=float, default=0.05)
+    parser.add_argument("--count", type=int, default=20)
+    parser.add_argument("--rounds", type=int, default=5)
+    args = parser.parse_args()
+
+    fake = FakeGmail(latency=args.latency).start()
+    service = fake.service()
+
+    print(f"latency={args.latency * 1000:.0f} ms  messages={args.count}")
+    print(f"{'strategy':<12}{'ms/inbox':>10}{'requests':>10}{'bytes':>10}")
+
+    for name, fetch in (("sequential", sequential), ("batch", batched)):
+        fake.reset_counters()
+        start = time.perf_counter()
+        for _ in range(args.rounds):
+            listing = service.users().messages().list(
+                userId="me", maxResults=args.count, labelIds=["INBOX"]
+            ).execute()
+            ids = [m["id"] for m in listing["messages"]]
+            fetched = fetch(service, ids)
+            assert all(fetched)
+        ms = (time.perf_counter() - start) / args.rounds * 1000
+        print(f"{name:<12}{ms:>10.1f}{fake.requests / args.rounds:>10.0f}"
+              f"{fake.bytes_sent // args.rounds:>10}")
+
+    fake.stop()
+
+
+if __name__ == "__main__":
+    main()
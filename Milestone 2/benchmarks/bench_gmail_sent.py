@@ -0,0 +1,59 @@
+"""
+Sent list benchmark: format="full" per message vs batched metadata.
+
+Messages carry an attachment of --attachment-kb so the bandwidth gap for
+attachment-heavy mailboxes is visible:
+
+    python benchmarks/bench_gmail_sent.py --attachment-kb 2048
+"""
+import argparse
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from gmail_client import batch_get, SENT_HEADERS  # noqa: E402
+from fake_gmail import FakeGmail  # noqa: E402
+
+
+def full_fetch(service, ids):
+    # gmail_sent before: every message downloaded with all MIME parts
+    return [
+        service.users().messages().get(userId="me", id=i, format="full").execute()
+        for i in ids
+    ]
+
+
+def metadata_fetch(service, ids):
+    return batch_get(service, ids, headers=SENT_HEADERS)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--latency", type=float, default=0.05)
+    parser.add_argument("--attachment-kb", type=int, default=1024)
+    parser.add_argument("--count", type=int, default=20)
+    args = parser.parse_args()
+
+    fake = FakeGmail(messages=2 * args.count, latency=args.latency,
+                     attachment_kb=args.attachment_kb).start()
+    service = fake.service()
+
+    print(f"latency={args.latency * 1000:.0f} ms  attachment={args.attachment_kb} KB")
+    print(f"{'strategy':<10}{'ms/page':>10}{'requests':>10}{'KB':>12}")
+
+    for name, fetch in (("full", full_fetch), ("metadata", metadata_fetch)):
+        fake.reset_counters()
+        start = time.perf_counter()
+        listing = service.users().messages().list(
+            userId="me", maxResults=args.count, labelIds=["SENT"]
+        ).execute()
+        fetch(service, [m["id"] for m in listing["messages"]])
+        ms = (time.perf_counter() - start) * 1000
+        print(f"{name:<10}{ms:>10.1f}{fake.requests:>10}{fake.bytes_sent / 1024:>12.1f}")
+
+    fake.stop()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,79 @@
+"""
+Per-request Gmail client overhead against a local fake Gmail server.
+
+Compares building a fresh service for every request (what
+get_gmail_service used to do: parse the discovery document, new HTTP
+transport, new TCP connection) with gmail_pool.GmailServicePool:
+
+    python benchmarks/bench_gmail_service.py --latency 0.02 --requests 50
+"""
+import argparse
+import json
+import os
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import httplib2
+from google.oauth2.credentials import Credentials
+from google_auth_httplib2 import AuthorizedHttp
+from googleapiclient import discovery_cache
+from googleapiclient.discovery import build, build_from_document
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from gmail_pool import GmailServicePool  # noqa: E402
+from fake_gmail import FakeGmail  # noqa: E402
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--latency", type=float, default=0.02)
+    parser.add_argument("--requests", type=int, default=50)
+    parser.add_argument("--threads", type=int, default=4)
+    args = parser.parse_args()
+
+    fake = FakeGmail(messages=40, latency=args.latency).start()
+    creds = Credentials(token="bench-token")
+
+    # Same document build() would read, pointed at the fake server
+    text = discovery_cache.get_static_doc("gmail", "v1")
+    patched = json.loads(text)
+    patched["rootUrl"] = patched["baseUrl"] = fake.url
+    patched_text = json.dumps(patched)
+
+    def rebuilt():
+        http = AuthorizedHttp(creds, http=httplib2.Http())
+        return build_from_document(patched_text, http=http)
+
+    pool = GmailServicePool(document=patched)
+
+    def pooled():
+        return pool.get("user", creds)
+
+    # Construction alone, no network: what build() costs before any API call
+    start = time.perf_counter()
+    for _ in range(20):
+        build("gmail", "v1", credentials=creds, static_discovery=True)
+    build_ms = (time.perf_counter() - start) / 20 * 1000
+    print(f"build('gmail', 'v1') alone: {build_ms:.1f} ms")
+
+    print(f"latency={args.latency * 1000:.0f} ms  requests={args.requests}")
+    print(f"{'strategy':<10}{'threads':>8}{'ms/request':>12}{'overhead ms':>13}")
+
+    for threads in (1, args.threads):
+        for name, service_for in (("rebuild", rebuilt), ("pooled", pooled)):
+            def one(_):
+                service_for().users().getProfile(userId="me").execute()
+
+            one(0)   # warm up (pool entry / first connection)
+            start = time.perf_counter()
+            with ThreadPoolExecutor(threads) as ex:
+                list(ex.map(one, range(args.requests)))
+            ms = (time.perf_counter() - start) / args.requests * 1000 * threads
+            print(f"{name:<10}{threads:>8}{ms:>12.1f}{ms - args.latency * 1000:>13.1f}")
+
+    fake.stop()
+
+
+if __name__ == "__main__":
+    main()
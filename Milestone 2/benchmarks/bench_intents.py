@@ -0,0 +1,213 @@
+"""
+Voice command matching: the old includes() chains vs the intents grammar.
+
+Runs a labelled set of utterances the way recognizers return them
+(punctuation, fillers, number words, homophones) through a Python port
+of the voice_webspeech.js / voice_dashboard.js chains and through
+intents.match_command:
+
+    python benchmarks/bench_intents.py --rounds 2000
+
+Reports accuracy and mean time per utterance for each. When node is on
+PATH, every case (plus some extra number phrasings) is also run through
+static/js/voice_intents.js with the tries client_grammar() exports, and
+any result that differs from intents.py is listed; the exit status is 1
+then, so the two matchers can't drift apart unnoticed.
+"""
+import argparse
+import json
+import os
+import re
+import shutil
+import subprocess
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from intents import client_grammar, match_command  # noqa: E402
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+VOICE_INTENTS_JS = os.path.join(ROOT, "static", "js", "voice_intents.js")
+
+# (utterance, page, reading, expected (intent, number))
+CASES = [
+    ("Open Gmail.", "dashboard", False, ("open_gmail", None)),
+    ("log out", "dashboard", False, ("logout", None)),
+    ("Logout.", "dashboard", False, ("logout", None)),
+    ("sign out please", "dashboard", False, ("logout", None)),
+    ("what time is it", "dashboard", False, None),
+    ("email three", "gmail_inbox", False, ("open", 3)),
+    ("Open email number 12.", "gmail_inbox", False, ("open", 12)),
+    ("open email twenty-two", "gmail_inbox", False, ("open", 22)),
+    ("Email to.", "gmail_inbox", False, ("open", 2)),
+    ("open the third one", "gmail_inbox", False, ("open", 3)),
+    ("open email eleven", "gmail_inbox", False, ("open", 11)),
+    ("open sent mail four", "gmail_sent", False, ("open", 4)),
+    ("Sent mail for.", "gmail_sent", False, ("open", 4)),
+    ("more", "gmail_inbox", False, ("more", None)),
+    ("Next page.", "gmail_sent", False, ("more", None)),
+    ("read this email", "read_mail", False, ("read", None)),
+    ("Compose.", "gmail_inbox", False, ("compose", None)),
+    ("new mail", "gmail_sent", False, ("compose", None)),
+    ("Go back.", "read_mail", False, ("back", None)),
+    ("I'm not ready yet", "gmail_inbox", False, None),
+    ("somebody wrote something", "gmail_inbox", False, None),
+    ("Pause.", "read_mail", True, ("pause", None)),
+    ("continue", "read_mail", True, ("resume", None)),
+    ("stop", "read_mail", True, ("stop", None)),
+    ("go back", "read_mail", True, ("back", None)),
+    ("what about the bread", "read_mail", True, None),
+]
+
+
+# Only for the browser/server comparison: number parsing corners
+PARITY_CASES = [
+    ("open email one hundred five", "gmail_inbox", False),
+    ("open the twenty second one", "gmail_inbox", False),
+    ("email twenty", "gmail_inbox", False),
+    ("Open email 3rd.", "gmail_inbox", False),
+    ("open e-mail number 7 please", "gmail_inbox", False),
+    ("to", "gmail_inbox", False),
+    ("email for", "gmail_sent", False),
+    ("one hundred", "gmail_inbox", False),
+    ("open mail thirty first", "gmail_inbox", False),
+    ("read it now", "read_mail", False),
+    ("hold on", "read_mail", True),
+    ("go to gmail", "dashboard", False),
+    ("", "dashboard", False),
+    ("gmail", "unknown_page", False),
+]
+
+
+# ---------- the matching this replaced (JS before, ported) ----------
+def legacy_index(text):
+    words = {"one": 1, "two": 2, "three": 3, "four": 4, "five": 5,
+             "six": 6, "seven": 7, "eight": 8, "nine": 9, "ten": 10}
+    digit = re.search(r"\b(\d+)\b", text)
+    if digit:
+        return int(digit.group(1))
+    for w, n in words.items():
+        if w in text:
+            return n
+    return None
+
+
+def legacy_match(text, page, reading):
+    text = text.lower().strip()
+    if page == "dashboard":
+        if "gmail" in text:
+            return ("open_gmail", None)
+        if "logout" in text:
+            return ("logout", None)
+        return None
+
+    if reading:
+        if "pause" in text:
+            return ("pause", None)
+        if "resume" in text or "continue" in text:
+            return ("resume", None)
+        if "stop" in text:
+            return ("stop", None)
+        if "back" in text:
+            return ("back", None)
+        return None
+
+    if "read" in text:
+        return ("read", None)
+    if page in ("gmail_inbox", "gmail_sent") and ("more" in text or "next page" in text):
+        return ("more", None)
+    if page in ("gmail_inbox", "gmail_sent"):
+        n = legacy_index(text)
+        if n is not None:
+            return ("open", n)
+    if "compose" in text or "new mail" in text:
+        return ("compose", None)
+    if "back" in text:
+        return ("back", None)
+    return None
+
+
+def grammar_match(text, page, reading):
+    command = match_command(text, page, reading)
+    return (command["intent"], command["number"]) if command else None
+
+
+# ---------- the browser matcher (voice_intents.js) ----------
+NODE_HARNESS = """
+const fs = require("fs");
+const input = JSON.parse(fs.readFileSync(0, "utf8"));
+global.window = { VOICE_GRAMMAR: input.grammar };
+eval(fs.readFileSync(input.script, "utf8"));
+const out = input.cases.map(([text, page, reading]) => window.matchCommand(text, page, reading));
+process.stdout.write(JSON.stringify(out));
+"""
+
+
+def js_matches(cases):
+    """voice_intents.js results for (text, page, reading) cases, via node."""
+    pages = sorted({page for _, page, _ in cases} | {"reading"})
+    proc = subprocess.run(
+        ["node", "-e", NODE_HARNESS],
+        input=json.dumps({
+            "grammar": client_grammar(*pages),
+            "script": VOICE_INTENTS_JS,
+            "cases": cases,
+        }),
+        capture_output=True, text=True, check=True
+    )
+    return json.loads(proc.stdout)
+
+
+def check_browser():
+    """Compare voice_intents.js with intents.py; returns the disagreements."""
+    cases = [(t, p, r) for t, p, r, _ in CASES] + PARITY_CASES
+    browser = js_matches(cases)
+    differ = [
+        (case, server, js)
+        for case, js in zip(cases, browser)
+        for server in [match_command(*case)]
+        if server != js
+    ]
+    print(f"voice_intents.js agrees with intents.py on {len(cases) - len(differ)}/{len(cases)}")
+    for (text, page, reading), server, js in differ:
+        print(f"  {text!r:<32} {page}{' reading' if reading else ''}: py={server} js={js}")
+    return differ
+
+
+def run(fn, rounds):
+    correct = sum(fn(t, p, r) == want for t, p, r, want in CASES)
+    start = time.perf_counter()
+    for _ in range(rounds):
+        for text, page, reading, _ in CASES:
+            fn(text, page, reading)
+    us = (time.perf_counter() - start) / (rounds * len(CASES)) * 1e6
+    return correct, us
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--rounds", type=int, default=500)
+    parser.add_argument("--verbose", action="store_true")
+    args = parser.parse_args()
+
+    print(f"{len(CASES)} utterances")
+    print(f"{'matcher':<10}{'correct':>9}{'us/utt':>9}")
+    for name, fn in (("legacy", legacy_match), ("grammar", grammar_match)):
+        correct, us = run(fn, args.rounds)
+        print(f"{name:<10}{correct:>6}/{len(CASES):<2}{us:>9.1f}")
+
+    if args.verbose:
+        for text, page, reading, want in CASES:
+            old, new = legacy_match(text, page, reading), grammar_match(text, page, reading)
+            if old != want or new != want:
+                print(f"  {text!r:<32} want={want} legacy={old} grammar={new}")
+
+    if shutil.which("node"):
+        if check_browser():
+            sys.exit(1)
+    else:
+        print("node not found: voice_intents.js not compared")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,176 @@
+"""
+Body extraction benchmark: the old recursive extract_body vs mail_body.
+
+The corpus is built with the email package in the shapes real mail
+takes (newsletter, reply with inline image, PDF attachment, forwarded
+message, calendar invite, plain text, a multi-MB HTML log) and converted
+to Gmail API payloads:
+
+    python benchmarks/bench_mail_body.py --rounds 200
+
+"same" is expected to be "no" where the old extractor was wrong (it
+showed an attached or forwarded HTML part), for plain text (now escaped)
+and for bodies over the size cap.
+"""
+import argparse
+import base64
+import os
+import sys
+import time
+import tracemalloc
+from email.message import EmailMessage
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from mail_body import extract_body  # noqa: E402
+
+
+# ---------- the extractor this replaced (app.py before) ----------
+def legacy_decode_base64(data):
+    return base64.urlsafe_b64decode(data).decode("utf-8", errors="ignore")
+
+
+def legacy_extract_body(payload):
+    html_body = None
+    text_body = None
+
+    def walk(part):
+        nonlocal html_body, text_body
+        mime = part.get("mimeType", "")
+        body = part.get("body", {}).get("data")
+        if body:
+            decoded = legacy_decode_base64(body)
+            if mime == "text/html":
+                html_body = decoded
+            elif mime == "text/plain" and not text_body:
+                text_body = decoded
+        for p in part.get("parts", []):
+            walk(p)
+
+    walk(payload)
+    if html_body:
+        return html_body
+    if text_body:
+        return f"<pre>{text_body}</pre>"
+    return "No content found"
+
+
+# ---------- corpus ----------
+def to_payload(msg):
+    """email.message.Message -> Gmail 'full' payload (data inline)."""
+    part = {
+        "mimeType": msg.get_content_type(),
+        "filename": msg.get_filename() or "",
+        "headers": [{"name": k, "value": str(v)} for k, v in msg.items()],
+        "body": {"size": 0},
+    }
+    if msg.is_multipart():
+        part["parts"] = [to_payload(p) for p in msg.get_payload()]
+    else:
+        raw = msg.get_payload(decode=True) or b""
+        part["body"] = {"size": len(raw), "data": base64.urlsafe_b64encode(raw).decode()}
+    return part
+
+
+def newsletter():
+    m = EmailMessage()
+    m["Subject"] = "Weekly digest"
+    m.set_content("Top stories this week.\n" * 200)
+    m.add_alternative("<table><tr><td><h1>Top stories</h1>" + "<p>Story text é</p>" * 400
+                      + "</td></tr></table>", subtype="html")
+    return m
+
+
+def reply_with_inline_image():
+    m = EmailMessage()
+    m.set_content("Thanks, see the chart below.\n\n> earlier message\n" * 20)
+    m.add_alternative('<p>Thanks, see the chart:</p><img src="cid:chart">'
+                      "<blockquote>earlier message</blockquote>" * 20, subtype="html")
+    m.get_payload()[1].add_related(os.urandom(120 * 1024), "image", "png", cid="<chart>")
+    return m
+
+
+def with_pdf(size_kb=2048):
+    m = EmailMessage()
+    m.set_content("Report attached.\n")
+    m.add_alternative("<p>Report attached.</p>", subtype="html")
+    m.add_attachment(os.urandom(size_kb * 1024), maintype="application",
+                     subtype="pdf", filename="report.pdf")
+    m.add_attachment("<html><body>" + "<p>attached page</p>" * 2000 + "</body></html>",
+                     subtype="html", filename="page.html")
+    return m
+
+
+def forwarded():
+    inner = newsletter()
+    m = EmailMessage()
+    m.set_content("FYI, forwarding this.\n")
+    m.add_alternative("<p>FYI, forwarding this.</p>", subtype="html")
+    m.add_attachment(inner)
+    return m
+
+
+def calendar_invite():
+    m = EmailMessage()
+    m.set_content("You have been invited to: Sync\n" * 10)
+    m.add_alternative("<p>You have been invited to <b>Sync</b></p>" * 10, subtype="html")
+    m.add_attachment("BEGIN:VCALENDAR\n" + "X-PAD:1\n" * 2000 + "END:VCALENDAR\n",
+                     subtype="calendar", filename="invite.ics")
+    return m
+
+
+def plain_only():
+    m = EmailMessage()
+    m.set_content("Just text, <not html>.\n" * 300)
+    return m
+
+
+def huge_html(size_mb=3):
+    m = EmailMessage()
+    m.set_content("see html")
+    m.add_alternative("<pre>" + "log line 0123456789 abcdefghij\n" * (size_mb * 33000)
+                      + "</pre>", subtype="html")
+    return m
+
+
+CORPUS = {
+    "newsletter": newsletter,
+    "inline-image": reply_with_inline_image,
+    "pdf-attach": with_pdf,
+    "forwarded": forwarded,
+    "invite": calendar_invite,
+    "plain": plain_only,
+    "huge-html": huge_html,
+}
+
+
+def measure(fn, payload, rounds):
+    fn(payload)
+    start = time.perf_counter()
+    for _ in range(rounds):
+        fn(payload)
+    ms = (time.perf_counter() - start) / rounds * 1000
+
+    tracemalloc.start()
+    fn(payload)
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return ms, peak
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--rounds", type=int, default=50)
+    args = parser.parse_args()
+
+    print(f"{'fixture':<14}{'legacy ms':>11}{'new ms':>9}{'legacy KB':>11}{'new KB':>9}  same")
+    for name, make in CORPUS.items():
+        payload = to_payload(make())
+        old_ms, old_peak = measure(legacy_extract_body, payload, args.rounds)
+        new_ms, new_peak = measure(extract_body, payload, args.rounds)
+        same = legacy_extract_body(payload) == extract_body(payload)
+        print(f"{name:<14}{old_ms:>11.3f}{new_ms:>9.3f}"
+              f"{old_peak // 1024:>11}{new_peak // 1024:>9}  {'yes' if same else 'no'}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,142 @@
+"""
+Whisper-on-CPU benchmark: real-time factor and streaming latency per model.
+
+Point it at a few recorded voice commands / dictated sentences (any
+format ffmpeg reads):
+
+    python benchmarks/bench_transcribe.py clips/*.wav --models tiny.en base.en small.en --threads 2
+
+Per model it reports load time, the real-time factor of a one-shot
+transcription (decode time / audio length; below 1.0 keeps up with
+speech), and a streamed replay through AudioStream in 0.5 s chunks:
+time to the first partial and the wait after the last chunk, which is
+what the user notices. With --expect, word error rate against a text
+file holding one line per clip is added.
+
+For voice commands, pass the page to decode with its command grammar
+(as /transcribe?grammar= does) and check the wait stays under ~300 ms:
+
+    python benchmarks/bench_transcribe.py commands/*.wav --models tiny.en base.en --grammar gmail_inbox
+"""
+import argparse
+import os
+import sys
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from intents import grammar_for  # noqa: E402
+from transcriber import (  # noqa: E402
+    SAMPLE_RATE, AudioStream, Transcriber, available, decode_compressed
+)
+
+CHUNK_SECONDS = 0.5
+
+
+def load_clip(path):
+    with open(path, "rb") as f:
+        return decode_compressed(f.read())
+
+
+def word_error_rate(reference, hypothesis):
+    ref = reference.lower().split()
+    hyp = hypothesis.lower().replace(",", "").replace(".", "").split()
+    # Levenshtein over words
+    row = list(range(len(hyp) + 1))
+    for i, r in enumerate(ref, 1):
+        prev, row[0] = row[0], i
+        for j, h in enumerate(hyp, 1):
+            prev, row[j] = row[j], min(row[j] + 1, row[j - 1] + 1, prev + (r != h))
+    return row[-1] / max(1, len(ref))
+
+
+def stream_clip(transcriber, audio, grammar=None):
+    """
+    Replay `audio` in 0.5 s chunks -> (first partial at s, wait after
+    last chunk s, text). With a grammar, a pass that yields a complete
+    command ends the clip early, as the /transcribe route does.
+    """
+    stream = AudioStream("audio/l16;rate=16000")
+    step = int(CHUNK_SECONDS * SAMPLE_RATE)
+    min_new = CHUNK_SECONDS if grammar else 1.0
+    first = None
+
+    for i in range(0, len(audio), step):
+        pcm = (np.clip(audio[i:i + step], -1, 1) * 32767).astype("<i2").tobytes()
+        stream.append(pcm)
+        sent = time.perf_counter()
+        timings = stream.update(transcriber, final=False, min_new=min_new, grammar=grammar)
+        if timings and first is None and stream.text():
+            # Speaking time up to this chunk plus the pass that produced it
+            first = stream.seconds + timings["decode_ms"] / 1000
+        if grammar and timings:
+            command = grammar.match(stream.text())
+            if command and command["complete"] and stream.trailing_silence():
+                return first, time.perf_counter() - sent, stream.text()
+
+    sent = time.perf_counter()
+    stream.update(transcriber, final=True, grammar=grammar)
+    return first, time.perf_counter() - sent, stream.text()
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("clips", nargs="+")
+    parser.add_argument("--models", nargs="+", default=["tiny.en", "base.en", "small.en"])
+    parser.add_argument("--threads", type=int, default=2)
+    parser.add_argument("--expect", help="text file, one reference transcript per clip")
+    parser.add_argument("--grammar", help="page whose voice commands to decode, e.g. gmail_inbox")
+    args = parser.parse_args()
+
+    if not available():
+        sys.exit("openai-whisper and ffmpeg are required")
+
+    grammar = grammar_for(args.grammar) if args.grammar else None
+    if args.grammar and grammar is None:
+        sys.exit(f"no commands for page {args.grammar!r}")
+
+    clips = [load_clip(p) for p in args.clips]
+    total_s = sum(len(c) for c in clips) / SAMPLE_RATE
+    expected = None
+    if args.expect:
+        with open(args.expect) as f:
+            expected = [line.strip() for line in f]
+
+    print(f"{len(clips)} clips, {total_s:.1f} s of audio, {args.threads} threads"
+          + (f", {args.grammar} commands" if grammar else ""))
+    print(f"{'model':<10}{'load s':>8}{'RTF':>7}{'1st part s':>12}{'final s':>9}{'WER':>7}")
+
+    for model in args.models:
+        transcriber = Transcriber(model=model, workers=1, threads=args.threads,
+                                  max_pending=1, timeout=600)
+        start = time.perf_counter()
+        transcriber.start(timeout=600)
+        load_s = time.perf_counter() - start
+
+        decode_s = 0.0
+        firsts, finals, errors = [], [], []
+        for n, audio in enumerate(clips):
+            start = time.perf_counter()
+            if grammar:
+                transcriber.transcribe(audio, grammar.prompt, grammar.words)
+            else:
+                transcriber.transcribe(audio)
+            decode_s += time.perf_counter() - start
+
+            first, final, text = stream_clip(transcriber, audio, grammar)
+            if first is not None:
+                firsts.append(first)
+            finals.append(final)
+            if expected and n < len(expected):
+                errors.append(word_error_rate(expected[n], text))
+
+        transcriber.shutdown()
+        first_s = f"{np.mean(firsts):.2f}" if firsts else "-"
+        wer = f"{np.mean(errors):.2f}" if errors else "-"
+        print(f"{model:<10}{load_s:>8.1f}{decode_s / total_s:>7.2f}{first_s:>12}"
+              f"{np.mean(finals):>9.2f}{wer:>7}")
+
+
+if __name__ == "__main__":
+    main()
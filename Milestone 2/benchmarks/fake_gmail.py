@@ -0,0 +1,226 @@
+"""
+Tiny local stand-in for the Gmail REST API, used by the benchmarks.
+
+Serves messages.list, messages.get (metadata / full), history.list and the
+/batch endpoint with a configurable per-request latency, and counts the
+requests and bytes each client costs.
+"""
+import base64
+import json
+import os
+import re
+import threading
+import time
+from email.parser import BytesParser
+from email.policy import HTTP
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlparse, parse_qs
+
+import googleapiclient
+from googleapiclient.discovery import build_from_document
+
+
+def _b64(text):
+    return base64.urlsafe_b64encode(text.encode()).decode()
+
+
+def make_message(i, label, attachment_kb=0):
+    headers = [
+        {"name": "Subject", "value": f"Message {i}"},
+        {"name": "From", "value": f"Sender {i} <sender{i}@example.com>"},
+        {"name": "To", "value": "me@example.com"},
+        {"name": "Date", "value": "Mon, 12 Oct 2026 09:%02d:00 +0000" % (i % 60)},
+        {"name": "Message-ID", "value": f"<msg{i}@example.com>"},
+        {"name": "Received", "value": "from mx.example.com by gmail"},
+    ]
+    parts = [
+        {"mimeType": "text/plain", "body": {"data": _b64(f"Hello {i}. " * 40)}},
+        {"mimeType": "text/html", "body": {"data": _b64(f"<p>Hello {i}.</p>" * 40)}},
+    ]
+    if attachment_kb:
+        parts.append({
+            "mimeType": "application/pdf",
+            "filename": f"report{i}.pdf",
+            "body": {"data": _b64("x" * attachment_kb * 1024)},
+        })
+    return {
+        "id": f"m{i:05d}",
+        "threadId": f"t{i:05d}",
+        "labelIds": [label],
+        "historyId": str(1000 + i),
+        "internalDate": str(1_790_000_000_000 + i * 60_000),
+        "payload": {"mimeType": "multipart/mixed", "headers": headers, "parts": parts},
+    }
+
+
+class FakeGmail:
+    def __init__(self, messages=200, latency=0.05, attachment_kb=0):
+        self.latency = latency
+        self.messages = {}
+        self.order = {"INBOX": [], "SENT": []}
+        for i in range(messages):
+            label = "SENT" if i % 2 else "INBOX"
+            msg = make_message(i, label, attachment_kb)
+            self.messages[msg["id"]] = msg
+            self.order[label].insert(0, msg["id"])
+        self.history_id = 1000 + messages
+        self.history = []
+        self.requests = 0
+        self.bytes_sent = 0
+        self._lock = threading.Lock()
+        self._server = None
+
+    # ---------- message views ----------
+    def view(self, msg, fmt, wanted):
+        if fmt == "full":
+            return msg
+        if fmt == "minimal":
+            return {k: msg[k] for k in ("id", "threadId", "labelIds", "historyId", "internalDate")}
+        headers = msg["payload"]["headers"]
+        if wanted:
+            wanted = {w.lower() for w in wanted}
+            headers = [h for h in headers if h["name"].lower() in wanted]
+        out = {k: msg[k] for k in ("id", "threadId", "labelIds", "historyId", "internalDate")}
+        out["payload"] = {"mimeType": msg["payload"]["mimeType"], "headers": headers}
+        return out
+
+    def deliver(self, label="INBOX"):
+        """Simulate a new message arriving (for history sync benchmarks)."""
+        with self._lock:
+            i = len(self.messages)
+            msg = make_message(i, label)
+            self.history_id += 1
+            msg["historyId"] = str(self.history_id)
+            msg["internalDate"] = str(1_790_000_000_000 + i * 60_000)
+            self.messages[msg["id"]] = msg
+            self.order[label].insert(0, msg["id"])
+            self.history.append({
+                "id": str(self.history_id),
+                "messagesAdded": [{"message": {"id": msg["id"], "threadId": msg["threadId"],
+                                               "labelIds": [label]}}],
+            })
+        return msg["id"]
+
+    def route(self, method, path, query, body=b""):
+        q = parse_qs(query)
+        m = re.fullmatch(r"/gmail/v1/users/me/messages", path)
+        if m and method == "GET":
+            label = q.get("labelIds", ["INBOX"])[0]
+            size = int(q.get("maxResults", ["100"])[0])
+            start = int(q.get("pageToken", ["0"])[0])
+            ids = self.order[label][start:start + size]
+            out = {"messages": [{"id": i, "threadId": self.messages[i]["threadId"]} for i in ids],
+                   "resultSizeEstimate": len(self.order[label])}
+            if start + size < len(self.order[label]):
+                out["nextPageToken"] = str(start + size)
+            return 200, out
+
+        m = re.fullmatch(r"/gmail/v1/users/me/messages/([^/]+)", path)
+        if m and method == "GET":
+            msg = self.messages.get(m.group(1))
+            if msg is None:
+                return 404, {"error": {"code": 404, "message": "Not Found"}}
+            return 200, self.view(msg, q.get("format", ["full"])[0], q.get("metadataHeaders"))
+
+        if path == "/gmail/v1/users/me/history" and method == "GET":
+            start = int(q["startHistoryId"][0])
+            changes = [h for h in self.history if int(h["id"]) > start]
+            return 200, {"history": changes, "historyId": str(self.history_id)}
+
+        if path == "/gmail/v1/users/me/profile" and method == "GET":
+            return 200, {"emailAddress": "me@example.com", "historyId": str(self.history_id)}
+
+        if path == "/gmail/v1/users/me/messages/send" and method == "POST":
+            return 200, {"id": "sent-%d" % time.time_ns(), "threadId": "t-sent"}
+
+        return 404, {"error": {"code": 404, "message": f"no route {method} {path}"}}
+
+    def batch(self, content_type, body):
+        msg = BytesParser(policy=HTTP).parsebytes(
+            b"Content-Type: " + content_type.encode() + b"\r\n\r\n" + body
+        )
+        boundary = "batch_fake_boundary"
+        out = []
+        for part in msg.iter_parts():
+            inner = part.get_payload(decode=True).decode()
+            request_line = inner.split("\r\n", 1)[0] if "\r\n" in inner else inner.split("\n", 1)[0]
+            method, url, _ = request_line.split(" ", 2)
+            parsed = urlparse(url)
+            status, payload = self.route(method, parsed.path, parsed.query)
+            content_id = part["Content-ID"].strip("<>")
+            out.append(
+                f"--{boundary}\r\nContent-Type: application/http\r\n"
+                f"Content-ID: <response-{content_id}>\r\n\r\n"
+                f"HTTP/1.1 {status} OK\r\nContent-Type: application/json\r\n\r\n"
+                f"{json.dumps(payload)}\r\n"
+            )
+        out.append(f"--{boundary}--\r\n")
+        return f"multipart/mixed; boundary={boundary}", "".join(out).encode()
+
+    # ---------- server ----------
+    def start(self):
+        fake = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+            disable_nagle_algorithm = True
+
+            def log_message(self, *args):
+                pass
+
+            def _reply(self, status, content_type, data):
+                with fake._lock:
+                    fake.requests += 1
+                    fake.bytes_sent += len(data)
+                time.sleep(fake.latency)
+                self.send_response(status)
+                self.send_header("Content-Type", content_type)
+                self.send_header("Content-Length", str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+
+            def _handle(self, method):
+                length = int(self.headers.get("Content-Length") or 0)
+                body = self.rfile.read(length) if length else b""
+                parsed = urlparse(self.path)
+                if parsed.path == "/batch" or parsed.path.startswith("/batch/"):
+                    ctype, data = fake.batch(self.headers["Content-Type"], body)
+                    return self._reply(200, ctype, data)
+                status, payload = fake.route(method, parsed.path, parsed.query, body)
+                self._reply(status, "application/json", json.dumps(payload).encode())
+
+            def do_GET(self):
+                self._handle("GET")
+
+            def do_POST(self):
+                self._handle("POST")
+
+        self._server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        threading.Thread(target=self._server.serve_forever, daemon=True).start()
+        return self
+
+    @property
+    def url(self):
+        return "http://127.0.0.1:%d/" % self._server.server_address[1]
+
+    def reset_counters(self):
+        with self._lock:
+            self.requests = 0
+            self.bytes_sent = 0
+
+    def stop(self):
+        self._server.shutdown()
+
+    def service(self, http=None):
+        """A real googleapiclient Gmail service pointed at this server."""
+        import httplib2
+
+        path = os.path.join(
+            os.path.dirname(googleapiclient.__file__),
+            "discovery_cache", "documents", "gmail.v1.json"
+        )
+        with open(path) as f:
+            doc = json.load(f)
+        doc["rootUrl"] = self.url
+        doc["baseUrl"] = self.url
+        return build_from_document(doc, http=http or httplib2.Http())
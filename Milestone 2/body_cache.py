@@ -0,0 +1,152 @@
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+from gmail_client import batch_get, header_value
+from speech_text import speech_chunks
+
+# ================= DECODED BODY CACHE =================
+# Headers read_email.html needs next to the body, plus what a reply needs
+BODY_HEADERS = ["Subject", "From", "To", "Reply-To", "Message-ID", "References"]
+
+
+def message_entry(msg, extract):
+    """
+    Full Gmail message -> what open_email / open_sent render, including
+    the body as ready-to-speak chunks for the voice reader.
+    """
+    headers = msg["payload"].get("headers", [])
+    body = extract(msg["payload"])
+    return {
+        "thread_id": msg.get("threadId"),
+        "headers": {h: header_value(headers, h) for h in BODY_HEADERS},
+        "body": body,
+        "speech": speech_chunks(body),
+    }
+
+
+def entry_size(entry):
+    return (
+        len(entry["body"])
+        + sum(len(c) for c in entry["speech"])
+        + sum(len(v) for v in entry["headers"].values())
+    )
+
+
+class BodyCache:
+    """
+    Thread-safe LRU of decoded message bodies keyed by (user_id, msg_id),
+    evicting least recently read entries once `max_bytes` is exceeded.
+    Gmail messages are immutable, so entries never go stale.
+    """
+
+    def __init__(self, max_bytes=32 * 1024 * 1024):
+        self.max_bytes = max_bytes
+        self.size = 0
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, user_id, msg_id):
+        key = (user_id, msg_id)
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is not None:
+                self._data.move_to_end(key)
+            return entry
+
+    def __contains__(self, key):
+        with self._lock:
+            return key in self._data
+
+    def put(self, user_id, msg_id, entry):
+        size = entry_size(entry)
+        if size > self.max_bytes:
+            return
+
+        key = (user_id, msg_id)
+        with self._lock:
+            old = self._data.pop(key, None)
+            if old is not None:
+                self.size -= entry_size(old)
+
+            self._data[key] = entry
+            self.size += size
+            while self.size > self.max_bytes:
+                _, evicted = self._data.popitem(last=False)
+                self.size -= entry_size(evicted)
+
+    def forget(self, user_id):
+        with self._lock:
+            for key in [k for k in self._data if k[0] == user_id]:
+                self.size -= entry_size(self._data.pop(key))
+
+    def __len__(self):
+        return len(self._data)
+
+
+# ================= PREFETCH =================
+class BodyPrefetcher:
+    """
+    Speculatively loads the next few messages the user is likely to open
+    into a BodyCache, one Gmail batch call per prefetch, off the request
+    thread. A request for a message that is still in flight waits for
+    that fetch instead of issuing a second one.
+    """
+
+    def __init__(self, cache, make_service, extract, workers=2):
+        self.cache = cache
+        self.make_service = make_service
+        self.extract = extract
+        self._pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="prefetch")
+        self._inflight = {}
+        self._lock = threading.Lock()
+
+    def prefetch(self, user_id, ids):
+        with self._lock:
+            ids = [
+                i for i in ids
+                if (user_id, i) not in self._inflight and (user_id, i) not in self.cache
+            ]
+            if not ids:
+                return None
+
+            future = self._pool.submit(self._load, user_id, ids)
+            for msg_id in ids:
+                self._inflight[(user_id, msg_id)] = future
+
+        future.add_done_callback(lambda f: self._done(user_id, ids, f))
+        return future
+
+    def wait(self, user_id, msg_id, timeout=10):
+        """Cached entry, waiting for an in-flight prefetch if there is one."""
+        entry = self.cache.get(user_id, msg_id)
+        if entry is not None:
+            return entry
+
+        with self._lock:
+            future = self._inflight.get((user_id, msg_id))
+        if future is not None:
+            try:
+                future.result(timeout=timeout)
+            except Exception:
+                pass
+        return self.cache.get(user_id, msg_id)
+
+    def _load(self, user_id, ids):
+        service = self.make_service(user_id)
+        for msg_id, msg in zip(ids, batch_get(service, ids, fmt="full")):
+            if msg:
+                self.cache.put(user_id, msg_id, message_entry(msg, self.extract))
+
+    def _done(self, user_id, ids, future):
+        with self._lock:
+            for msg_id in ids:
+                if self._inflight.get((user_id, msg_id)) is future:
+                    del self._inflight[(user_id, msg_id)]
+
+        # The request path just fetches on its own; only log the failure
+        if not future.cancelled() and future.exception() is not None:
+            print("⚠️ Prefetch failed:", future.exception())
+
+    def shutdown(self):
+        self._pool.shutdown(wait=False, cancel_futures=True)
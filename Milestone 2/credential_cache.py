@@ -0,0 +1,164 @@
+import json
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta, timezone
+
+from google.auth.exceptions import RefreshError
+from google.auth.transport.requests import Request
+from google.oauth2.credentials import Credentials
+
+
+# ================= CREDENTIAL CACHE =================
+def _utcnow():
+    # google-auth keeps `expiry` as a naive UTC datetime
+    return datetime.now(timezone.utc).replace(tzinfo=None)
+
+
+class CredentialCache:
+    """
+    In-process Gmail OAuth credentials per user.
+
+    Tokens are read from Mongo once (`load`) and kept. A refresh runs at
+    most once per user at a time; concurrent requests wait on that one
+    refresh and the new token is written back once (`save`). A background
+    thread refreshes active users' tokens `margin` seconds before they
+    expire, so requests normally never wait on the token endpoint.
+    """
+
+    def __init__(self, load, save, scopes, margin=300, idle_ttl=900,
+                 interval=30, workers=2):
+        self.load = load
+        self.save = save
+        self.scopes = scopes
+        self.margin = timedelta(seconds=margin)
+        self.idle_ttl = idle_ttl
+        self.interval = interval
+        self._entries = {}      # user_id -> [credentials, last_used]
+        self._inflight = {}     # user_id -> refresh Future
+        self._lock = threading.Lock()
+        self._load_lock = threading.Lock()
+        self._pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="token-refresh")
+        self._stop = threading.Event()
+        self._thread = None
+
+    # ---------- READ ----------
+    def get(self, user_id, tokens=None):
+        """
+        Valid credentials for `user_id`. `tokens` (the user's stored
+        gmail.tokens, if the caller already has them) saves the Mongo read
+        on a miss. Returns None if the user has no Gmail linked; raises
+        RefreshError if the grant was revoked.
+        """
+        with self._lock:
+            entry = self._entries.get(user_id)
+            if entry is not None and tokens and \
+                    tokens.get("refresh_token") != entry[0].refresh_token:
+                entry = None    # Gmail was re-linked (maybe another account)
+            if entry is not None:
+                entry[1] = time.monotonic()
+
+        if entry is None:
+            entry = self._load(user_id, tokens)
+            if entry is None:
+                return None
+
+        creds = entry[0]
+        if self._expired(creds, timedelta(0)):
+            # Only blocks if the background refresh did not get there first
+            self.refresh(user_id).result()
+        elif self._expired(creds, self.margin):
+            self.refresh(user_id)
+        return creds
+
+    def _load(self, user_id, tokens):
+        # One Mongo read per cold user, however many requests arrive at once
+        with self._load_lock:
+            with self._lock:
+                entry = self._entries.get(user_id)
+                if entry is not None and (not tokens or
+                                          tokens.get("refresh_token") == entry[0].refresh_token):
+                    return entry
+
+            tokens = tokens or self.load(user_id)
+            if not tokens:
+                return None
+            entry = [
+                Credentials.from_authorized_user_info(tokens, self.scopes),
+                time.monotonic()
+            ]
+            with self._lock:
+                self._entries[user_id] = entry
+            return entry
+
+    def forget(self, user_id):
+        with self._lock:
+            self._entries.pop(user_id, None)
+
+    # ---------- REFRESH ----------
+    def refresh(self, user_id):
+        """Single-flight refresh: callers share one Future per user."""
+        with self._lock:
+            future = self._inflight.get(user_id)
+            if future is None:
+                future = self._pool.submit(self._refresh, user_id)
+                self._inflight[user_id] = future
+        return future
+
+    def _refresh(self, user_id):
+        try:
+            with self._lock:
+                entry = self._entries.get(user_id)
+            if entry is None:
+                return
+            creds = entry[0]
+            # A refresh that finished just before this one was queued
+            if not self._expired(creds, self.margin):
+                return
+
+            try:
+                creds.refresh(Request())
+            except RefreshError:
+                # Revoked: the next request rebuilds from Mongo and fails there
+                self.forget(user_id)
+                raise
+            self.save(user_id, json.loads(creds.to_json()))
+        finally:
+            with self._lock:
+                self._inflight.pop(user_id, None)
+
+    def _expired(self, creds, margin):
+        if not creds.token:
+            return True
+        return creds.expiry is not None and creds.expiry - margin <= _utcnow()
+
+    # ---------- BACKGROUND ----------
+    def start(self):
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, daemon=True, name="token-refresher")
+            self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        self._pool.shutdown(wait=False, cancel_futures=True)
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            now = time.monotonic()
+            with self._lock:
+                for user_id in [u for u, (_, used) in self._entries.items()
+                                if now - used > self.idle_ttl]:
+                    del self._entries[user_id]
+                due = [u for u, (creds, _) in self._entries.items()
+                       if self._expired(creds, self.margin)]
+
+            for user_id in due:
+                future = self.refresh(user_id)
+                future.add_done_callback(self._log_failure)
+
+    def _log_failure(self, future):
+        if not future.cancelled() and future.exception() is not None:
+            print("⚠️ Background token refresh failed:", future.exception())
+
+    def __len__(self):
+        return len(self._entries)
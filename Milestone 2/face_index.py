@@ -0,0 +1,550 @@
+import fcntl
+import json
+import os
+import threading
+from contextlib import nullcontext
+from datetime import datetime
+
+import numpy as np
+
+# ================= FACE INDEX =================
+# Same cut-off the login / register routes have always used
+FACE_MATCH_THRESHOLD = 0.45
+EMBEDDING_DIM = 128
+
+# Search modes: "exact" scans every row, "ivf" probes k-means partitions
+SEARCH_MODES = ("exact", "ivf")
+
+# Below this many faces a brute-force scan is already sub-millisecond
+IVF_MIN_SIZE = 2048
+
+
+def _sq_distances(matrix, sq_norms, q):
+    # |x - q|^2 = |x|^2 - 2 x.q + |q|^2  (one GEMV for the whole block)
+    sq = sq_norms - 2.0 * (matrix @ q) + (q @ q)
+    np.maximum(sq, 0.0, out=sq)
+    return sq
+
+
+def _nearest_centroid(vecs, centroids, chunk=16384):
+    c_norms = np.einsum("ij,ij->i", centroids, centroids)
+    out = np.empty(len(vecs), dtype=np.int32)
+    for start in range(0, len(vecs), chunk):
+        block = vecs[start:start + chunk]
+        # |x|^2 is constant per row, so it doesn't change the argmin
+        d = c_norms[None, :] - 2.0 * (block @ centroids.T)
+        out[start:start + chunk] = np.argmin(d, axis=1)
+    return out
+
+
+def face_profile(encodings):
+    """
+    Several enrollment embeddings -> (centroid, samples, spread), where
+    spread is the largest sample-to-centroid distance.
+    """
+    samples = np.asarray(encodings, dtype=np.float32).reshape(-1, EMBEDDING_DIM)
+    centroid = samples.mean(axis=0)
+    spread = 0.0
+    if len(samples) > 1:
+        spread = float(np.max(np.linalg.norm(samples - centroid, axis=1)))
+    return centroid, samples, spread
+
+
+def _user_profile(user):
+    # Stored centroid/spread when present, otherwise derived (older users)
+    encodings = user.get("face_encodings")
+    if not encodings:
+        return None
+
+    centroid, samples, spread = face_profile(encodings)
+    if user.get("face_centroid") is not None:
+        centroid = np.asarray(user["face_centroid"], dtype=np.float32)
+        spread = float(user.get("face_spread", spread))
+    return centroid, samples, spread
+
+
+# ================= IVF PARTITIONING =================
+class IVFPartition:
+    """
+    NumPy-only inverted-file partitioning (k-means coarse quantizer).
+
+    Every row is assigned to its nearest of `nlist` centroids. A query only
+    looks at the rows of its `nprobe` nearest centroids, and those
+    candidates are then re-ranked with exact distances by FaceIndex.
+    """
+
+    def __init__(self, nlist, iters=10, seed=0):
+        self.nlist = nlist
+        self.iters = iters
+        self.seed = seed
+        self.centroids = None
+        self.trained_size = 0
+        self._order = np.empty(0, dtype=np.int64)
+        self._offsets = np.zeros(nlist + 1, dtype=np.int64)
+        self._tails = [[] for _ in range(nlist)]
+
+    def train(self, matrix):
+        rng = np.random.default_rng(self.seed)
+        n = len(matrix)
+
+        # Train on a sample; assignment below still covers every row
+        sample_size = min(n, 64 * self.nlist)
+        sample = matrix[rng.choice(n, sample_size, replace=False)]
+        centroids = sample[rng.choice(sample_size, self.nlist, replace=False)].copy()
+
+        for _ in range(self.iters):
+            labels = _nearest_centroid(sample, centroids)
+            sums = np.zeros_like(centroids)
+            np.add.at(sums, labels, sample)
+            counts = np.bincount(labels, minlength=self.nlist)
+            filled = counts > 0
+            centroids[filled] = sums[filled] / counts[filled, None]
+
+        self.centroids = centroids.astype(np.float32)
+
+        labels = _nearest_centroid(matrix, self.centroids)
+        self._order = np.argsort(labels, kind="stable")
+        self._offsets = np.zeros(self.nlist + 1, dtype=np.int64)
+        np.cumsum(np.bincount(labels, minlength=self.nlist), out=self._offsets[1:])
+        self._tails = [[] for _ in range(self.nlist)]
+        self.trained_size = n
+
+    def add(self, row, vec):
+        label = int(_nearest_centroid(vec[None, :], self.centroids)[0])
+        self._tails[label].append(row)
+
+    def candidates(self, q, nprobe):
+        nprobe = min(nprobe, self.nlist)
+        d = np.einsum("ij,ij->i", self.centroids, self.centroids) - 2.0 * (self.centroids @ q)
+        probe = np.argpartition(d, nprobe - 1)[:nprobe]
+
+        parts = [self._order[self._offsets[c]:self._offsets[c + 1]] for c in probe]
+        parts.extend(np.asarray(self._tails[c], dtype=np.int64) for c in probe)
+        return np.concatenate(parts)
+
+
+class FaceIndex:
+    """
+    In-memory index of enrolled face embeddings.
+
+    Each user is one row of a contiguous float32 (N x 128) matrix holding
+    the centroid of their enrollment samples, with a parallel list of Mongo
+    user ids, so matching a live face is a single vectorized distance
+    computation instead of one Mongo read and one face_distance call per
+    user. Users enrolled with several samples also keep those samples and
+    their spread, which are only consulted for faces near the threshold.
+    """
+
+    def __init__(self, dim=EMBEDDING_DIM, mode="exact", nprobe=8):
+        if mode not in SEARCH_MODES:
+            raise ValueError(f"Unknown face index mode: {mode}")
+
+        self.dim = dim
+        self.mode = mode
+        self.nprobe = nprobe
+        self._ivf = None
+        # Bumped by every full reload; a partition trained on an older
+        # matrix is thrown away
+        self._generation = 0
+        self._train_lock = threading.Lock()
+        self._lock = threading.RLock()
+        # Serializes check-and-insert within this process (match_or_add's
+        # `guard` extends it to other processes)
+        self._enroll_lock = threading.Lock()
+        self._matrix = np.empty((0, dim), dtype=np.float32)
+        self._sq_norms = np.empty(0, dtype=np.float32)
+        self._spread = np.empty(0, dtype=np.float32)
+        # user_id -> (k x 128) samples, only for users with k > 1
+        self._samples = {}
+        self._ids = []
+        self._size = 0
+        # Newest `created_at` covered by the index (snapshot delta cursor)
+        self.high_water = None
+        self.loaded = False
+
+    def __len__(self):
+        return self._size
+
+    @property
+    def matrix(self):
+        return self._matrix[:self._size]
+
+    @property
+    def ids(self):
+        return self._ids
+
+    # ---------- BUILD ----------
+    def _track(self, created_at):
+        if created_at and (self.high_water is None or created_at > self.high_water):
+            self.high_water = created_at
+
+    def _reset(self, matrix, ids, spread, samples, high_water):
+        with self._lock:
+            self._matrix = matrix
+            self._sq_norms = np.einsum("ij,ij->i", matrix, matrix)
+            self._spread = np.asarray(spread, dtype=np.float32)
+            self._samples = samples
+            self._ids = ids
+            self._size = len(ids)
+            self._ivf = None
+            self._generation += 1
+            self.high_water = high_water
+            self.loaded = True
+            self._ensure_partition()
+
+    def load(self, users):
+        """Rebuild the index from an iterable of Mongo user documents."""
+        ids = []
+        rows = []
+        spread = []
+        samples = {}
+        high_water = None
+        for user in users:
+            profile = _user_profile(user)
+            if profile is None:
+                continue
+
+            user_id = str(user["_id"])
+            ids.append(user_id)
+            rows.append(profile[0])
+            spread.append(profile[2])
+            if len(profile[1]) > 1:
+                samples[user_id] = profile[1]
+
+            created_at = user.get("created_at")
+            if created_at and (high_water is None or created_at > high_water):
+                high_water = created_at
+
+        matrix = np.asarray(rows, dtype=np.float32).reshape(-1, self.dim)
+        self._reset(np.ascontiguousarray(matrix), ids, spread, samples, high_water)
+
+    def merge(self, users):
+        """Add users not already indexed (e.g. enrolled since a snapshot)."""
+        # Read the cursor before locking: searches keep running meanwhile
+        users = [u for u in users if u.get("face_encodings")]
+
+        added = 0
+        with self._lock:
+            known = set(self._ids)
+            for user in users:
+                user_id = str(user["_id"])
+                profile = _user_profile(user) if user_id not in known else None
+                if profile is None:
+                    continue
+                self.add(user_id, profile[0], profile[1], profile[2], user.get("created_at"))
+                known.add(user_id)
+                added += 1
+            self.loaded = True
+            self._ensure_partition()
+        return added
+
+    def add(self, user_id, encoding, samples=None, spread=0.0, created_at=None):
+        """
+        Append one user (their centroid, or their only embedding), growing
+        the backing arrays geometrically.
+        """
+        vec = np.asarray(encoding, dtype=np.float32).reshape(self.dim)
+
+        with self._lock:
+            if self._size == self._matrix.shape[0]:
+                capacity = max(16, self._matrix.shape[0] * 2)
+                grown = np.empty((capacity, self.dim), dtype=np.float32)
+                grown[:self._size] = self._matrix[:self._size]
+                norms = np.empty(capacity, dtype=np.float32)
+                norms[:self._size] = self._sq_norms[:self._size]
+                spreads = np.zeros(capacity, dtype=np.float32)
+                spreads[:self._size] = self._spread[:self._size]
+                self._matrix = grown
+                self._sq_norms = norms
+                self._spread = spreads
+
+            self._matrix[self._size] = vec
+            self._sq_norms[self._size] = vec @ vec
+            self._spread[self._size] = spread
+            self._ids.append(str(user_id))
+            if samples is not None and len(samples) > 1:
+                self._samples[str(user_id)] = np.asarray(samples, dtype=np.float32)
+            if self._ivf is not None:
+                self._ivf.add(self._size, vec)
+            self._size += 1
+            self._track(created_at)
+
+    # ---------- SNAPSHOT ----------
+    @staticmethod
+    def _snapshot_lock(path, mode):
+        """flock on `<path>.lock`, shared by every worker using the snapshot."""
+        f = open(f"{path}.lock", "a")
+        fcntl.flock(f, mode)
+        return f
+
+    def save_snapshot(self, path):
+        """
+        Write the centroid matrix and the per-user samples to their own
+        `.npy` files and point `<path>.json` (ids, spreads, high-water mark)
+        at them. Only the JSON is swapped in atomically, so a worker
+        starting mid-write always sees matching matrices and ids.
+
+        Writers hold an exclusive lock on `<path>.lock` (readers a shared
+        one), skip the write when the current snapshot already covers as
+        much as this index, and only delete files older than the ones the
+        JSON names.
+        """
+        with self._lock:
+            matrix = self._matrix[:self._size].copy()
+            ids = list(self._ids)
+            spread = self._spread[:self._size].tolist()
+            sample_ids = list(self._samples)
+            sample_blocks = [self._samples[i] for i in sample_ids]
+            high_water = self.high_water
+
+        base = os.path.basename(path)
+        folder = os.path.dirname(os.path.abspath(path))
+
+        with self._snapshot_lock(path, fcntl.LOCK_EX):
+            current = self._read_meta(path)
+            if current and current.get("count", 0) >= len(ids) and (
+                    high_water is None
+                    or (current.get("high_water") or "") >= high_water.isoformat()):
+                return False
+
+            stamp = f"{datetime.utcnow():%Y%m%d%H%M%S%f}.{os.getpid()}"
+            matrix_file = f"{base}.{stamp}.npy"
+            samples_file = f"{base}.{stamp}.samples.npy"
+
+            np.save(os.path.join(folder, matrix_file), matrix)
+            np.save(
+                os.path.join(folder, samples_file),
+                np.concatenate(sample_blocks) if sample_blocks
+                else np.empty((0, self.dim), dtype=np.float32)
+            )
+
+            meta = {
+                "version": 2,
+                "dim": self.dim,
+                "count": len(ids),
+                "matrix": matrix_file,
+                "ids": ids,
+                "spread": spread,
+                "samples": samples_file,
+                "sample_ids": sample_ids,
+                "sample_counts": [len(b) for b in sample_blocks],
+                "high_water": high_water.isoformat() if high_water else None,
+            }
+            tmp = f"{path}.{os.getpid()}.tmp"
+            with open(tmp, "w") as f:
+                json.dump(meta, f)
+            os.replace(tmp, f"{path}.json")
+
+            # Older matrices can go: workers that mapped them keep their pages
+            prefix = f"{base}.{stamp}"
+            for name in os.listdir(folder):
+                if (name.startswith(base + ".") and name.endswith(".npy")
+                        and name[:len(prefix)] < prefix):
+                    try:
+                        os.remove(os.path.join(folder, name))
+                    except OSError:
+                        pass
+        return True
+
+    @staticmethod
+    def _read_meta(path):
+        try:
+            with open(f"{path}.json") as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    def load_snapshot(self, path):
+        """
+        Memory-map a snapshot written by save_snapshot(). Pages are shared
+        between workers until the first add() copies the matrix.
+        Returns False when no usable snapshot exists.
+        """
+        try:
+            with self._snapshot_lock(path, fcntl.LOCK_SH):
+                meta = self._read_meta(path)
+                if not meta or meta.get("version") != 2 or meta.get("dim") != self.dim:
+                    return False
+
+                folder = os.path.dirname(os.path.abspath(path))
+                matrix = np.load(os.path.join(folder, meta["matrix"]), mmap_mode="r")
+                sample_matrix = np.load(os.path.join(folder, meta["samples"]), mmap_mode="r")
+        except (OSError, ValueError, KeyError):
+            return False
+
+        count = meta["count"]
+        if matrix.shape != (count, self.dim) or len(meta["ids"]) != count:
+            return False
+
+        samples = {}
+        offset = 0
+        for user_id, k in zip(meta["sample_ids"], meta["sample_counts"]):
+            samples[user_id] = sample_matrix[offset:offset + k]
+            offset += k
+        if offset != sample_matrix.shape[0]:
+            return False
+
+        high_water = meta.get("high_water")
+        self._reset(
+            matrix,
+            meta["ids"],
+            meta["spread"],
+            samples,
+            datetime.fromisoformat(high_water) if high_water else None
+        )
+        return True
+
+    # ---------- SEARCH ----------
+    def _stale_partition(self):
+        n = self._size
+        return (self.mode == "ivf" and n >= IVF_MIN_SIZE
+                and (self._ivf is None or n > 2 * self._ivf.trained_size))
+
+    def _ensure_partition(self):
+        """Start (re)training in the background if needed; never blocks."""
+        if self._stale_partition() and not self._train_lock.locked():
+            threading.Thread(target=self.train_partition, daemon=True, name="face-ivf").start()
+
+    def train_partition(self):
+        """
+        Train (or retrain once the gallery has doubled) the IVF lists.
+        k-means runs on a view of the matrix without holding the index
+        lock; rows added meanwhile are assigned when the result is swapped
+        in. Until then searches use the previous partition or exact scans.
+        """
+        with self._train_lock:
+            with self._lock:
+                if not self._stale_partition():
+                    return
+                n = self._size
+                # Rows below n never change (add() copies them when growing)
+                matrix = self._matrix[:n]
+                generation = self._generation
+
+            ivf = IVFPartition(nlist=max(16, int(np.sqrt(n))))
+            ivf.train(matrix)
+
+            with self._lock:
+                if generation != self._generation:
+                    return
+                for row in range(n, self._size):
+                    ivf.add(row, self._matrix[row])
+                self._ivf = ivf
+
+    def distances(self, encoding):
+        """Euclidean distance from `encoding` to every enrolled centroid."""
+        q = np.asarray(encoding, dtype=np.float32).reshape(self.dim)
+
+        with self._lock:
+            n = self._size
+            matrix = self._matrix[:n]
+            sq_norms = self._sq_norms[:n]
+
+        return np.sqrt(_sq_distances(matrix, sq_norms, q))
+
+    def _candidates(self, q, exact):
+        """
+        (rows, distances) for every centroid the search looks at; rows is
+        None when that is the whole gallery. In "ivf" mode only the probed
+        partitions are scanned and their candidates re-ranked exactly;
+        small galleries and `exact=True` use the brute-force scan.
+        """
+        with self._lock:
+            n = self._size
+            if n == 0:
+                return None, np.empty(0, dtype=np.float32)
+
+            ivf = None
+            if self.mode == "ivf" and not exact and n >= IVF_MIN_SIZE:
+                self._ensure_partition()
+                ivf = self._ivf
+            rows = ivf.candidates(q, self.nprobe) if ivf is not None else None
+            matrix = self._matrix[:n]
+            sq_norms = self._sq_norms[:n]
+
+        if rows is not None:
+            matrix, sq_norms = matrix[rows], sq_norms[rows]
+
+        return rows, np.sqrt(_sq_distances(matrix, sq_norms, q))
+
+    def search(self, encoding, exact=False):
+        """
+        Return (row, distance) of the nearest enrolled centroid, or
+        (None, None) when there is nothing to compare against.
+        """
+        q = np.asarray(encoding, dtype=np.float32).reshape(self.dim)
+        rows, dists = self._candidates(q, exact)
+        if dists.size == 0:
+            return None, None
+
+        pos = int(np.argmin(dists))
+        best = pos if rows is None else int(rows[pos])
+        return best, float(dists[pos])
+
+    def match(self, encoding, threshold=FACE_MATCH_THRESHOLD, exact=False):
+        """
+        Return (user_id, distance) of the closest enrolled face, or
+        (None, distance) when nobody is under the threshold.
+
+        Centroids are compared first. A user whose centroid misses by less
+        than their spread may still have a sample under the threshold
+        (triangle inequality), so only those users' samples are checked.
+        """
+        q = np.asarray(encoding, dtype=np.float32).reshape(self.dim)
+
+        with self._lock:
+            ids = self._ids
+            samples = self._samples
+            rows, dists = self._candidates(q, exact)
+            spread = self._spread[:self._size] if rows is None else self._spread[rows]
+
+        if dists.size == 0:
+            return None, None
+
+        pos = int(np.argmin(dists))
+        row = pos if rows is None else int(rows[pos])
+        if dists[pos] < threshold:
+            return ids[row], float(dists[pos])
+
+        near = np.nonzero(dists < threshold + spread)[0]
+        for p in near[np.argsort(dists[near])]:
+            user_id = ids[int(p) if rows is None else int(rows[p])]
+            user_samples = samples.get(user_id)
+            if user_samples is None:
+                continue
+            d = float(np.min(np.linalg.norm(user_samples - q, axis=1)))
+            if d < threshold:
+                return user_id, d
+
+        return None, float(dists[pos])
+
+    # ---------- ENROLL ----------
+    def match_or_add(self, encoding, insert, threshold=FACE_MATCH_THRESHOLD,
+                     samples=None, spread=0.0, created_at=None, refresh=None,
+                     guard=None):
+        """
+        Atomic duplicate check + enrollment.
+
+        If `encoding` (a single embedding or a centroid) already matches
+        someone, returns (their_id, False). Otherwise calls `insert()`
+        (which must persist the user and return its id), adds the user and
+        returns (new_id, True).
+        The check is always exact, even in "ivf" mode, so an approximate
+        miss can never let a duplicate through. On a miss, `refresh()`
+        (which merges users enrolled by other processes and returns how
+        many it added) runs before the insert, so the check also covers
+        enrollments this process hasn't seen. `guard`, a context manager
+        held around the check and the insert (e.g. a MongoLock lease),
+        makes the pair atomic against enrollments in other processes too.
+        Searches from /verify_face are not blocked while this runs.
+        """
+        with self._enroll_lock, (guard if guard is not None else nullcontext()):
+            user_id, _ = self.match(encoding, threshold, exact=True)
+            if not user_id and refresh is not None and refresh():
+                user_id, _ = self.match(encoding, threshold, exact=True)
+            if user_id:
+                return user_id, False
+
+            new_id = insert()
+            self.add(new_id, encoding, samples, spread, created_at)
+            return str(new_id), True
@@ -0,0 +1,284 @@
+import multiprocessing
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed, TimeoutError as FutureTimeout
+
+import cv2
+import numpy as np
+import face_recognition
+
+
+# ================= FACE ENCODING POOL =================
+class FacePoolBusy(Exception):
+    """Raised when too many frames are already waiting for the pool."""
+
+
+def _ms(start, end):
+    return round((end - start) * 1000, 1)
+
+
+# ================= PREPROCESSING =================
+# cv2 can decode JPEGs straight to 1/2, 1/4 or 1/8 size (DCT scaling)
+DECODE_FLAGS = {
+    1: cv2.IMREAD_COLOR,
+    2: cv2.IMREAD_REDUCED_COLOR_2,
+    4: cv2.IMREAD_REDUCED_COLOR_4,
+    8: cv2.IMREAD_REDUCED_COLOR_8,
+}
+
+
+def decode_frame(data, decode_reduce=1):
+    """Compressed bytes -> RGB image, optionally decoded at reduced size."""
+    img = cv2.imdecode(
+        np.frombuffer(data, np.uint8),
+        DECODE_FLAGS.get(decode_reduce, cv2.IMREAD_COLOR)
+    )
+    if img is None:
+        return None
+    return cv2.cvtColor(img, cv2.COLOR_BGR2RGB)
+
+
+def detect_largest_face(rgb, detect_width=320, upsample=1):
+    """
+    Run HOG detection on a downscaled copy and map the largest box back
+    to `rgb` coordinates as (top, right, bottom, left), or None.
+    """
+    h, w = rgb.shape[:2]
+    scale = 1.0
+    small = rgb
+    if detect_width and w > detect_width:
+        scale = w / detect_width
+        small = cv2.resize(
+            rgb, (detect_width, max(1, int(round(h / scale)))),
+            interpolation=cv2.INTER_AREA
+        )
+
+    boxes = face_recognition.face_locations(small, number_of_times_to_upsample=upsample)
+    if not boxes:
+        return None
+
+    top, right, bottom, left = max(boxes, key=lambda b: (b[2] - b[0]) * (b[1] - b[3]))
+    return (
+        max(0, int(round(top * scale))),
+        min(w, int(round(right * scale))),
+        min(h, int(round(bottom * scale))),
+        max(0, int(round(left * scale))),
+    )
+
+
+def encode_frame(data, detect_width=320, decode_reduce=1, upsample=1):
+    """
+    JPEG/PNG bytes -> list of float32 face encodings, plus stage timings.
+
+    Detection runs on a `detect_width`-wide copy; the embedding is then
+    computed only for the largest face, on the full-resolution frame.
+    Runs inside a pool worker (or inline when the pool is disabled).
+    """
+    started = time.time()
+
+    rgb = decode_frame(data, decode_reduce)
+    if rgb is None:
+        return [], {"started": started, "decode_ms": _ms(started, time.time())}
+    decoded = time.time()
+
+    box = detect_largest_face(rgb, detect_width, upsample)
+    detected = time.time()
+    if box is None:
+        return [], {
+            "started": started,
+            "decode_ms": _ms(started, decoded),
+            "detect_ms": _ms(decoded, detected),
+        }
+
+    encodings = face_recognition.face_encodings(rgb, known_face_locations=[box])
+    encoded = time.time()
+
+    return [e.astype(np.float32) for e in encodings], {
+        "started": started,
+        "decode_ms": _ms(started, decoded),
+        "detect_ms": _ms(decoded, detected),
+        "encode_ms": _ms(detected, encoded),
+    }
+
+
+# ================= WARM-UP =================
+def warm_up():
+    """
+    Push a synthetic frame through decode, HOG detection and the ResNet
+    embedding so dlib's models and buffers are loaded before real traffic.
+    """
+    frame = np.full((240, 320, 3), 128, np.uint8)
+    ok, buf = cv2.imencode(".jpg", frame)
+    rgb = decode_frame(buf.tobytes())
+    detect_largest_face(rgb)
+    # Known box: forces landmarks + embedding even though there's no face
+    face_recognition.face_encodings(rgb, known_face_locations=[(60, 220, 180, 100)])
+
+
+def _init_worker(warm_count):
+    warm_up()
+    with warm_count.get_lock():
+        warm_count.value += 1
+
+
+class FaceEncoder:
+    """
+    Bounded process pool for face_recognition work.
+
+    dlib detection + the ResNet embedding hold the GIL for hundreds of ms,
+    so they run in worker processes and request threads only wait on a
+    future. Once `max_pending` frames are queued, new frames are rejected
+    with FacePoolBusy instead of piling up behind the pool.
+    """
+
+    def __init__(self, workers=2, max_pending=4, timeout=15,
+                 detect_width=320, decode_reduce=1, upsample=1):
+        self.workers = workers
+        self.max_pending = max_pending
+        self.timeout = timeout
+        self.detect_width = detect_width
+        self.decode_reduce = decode_reduce
+        self.upsample = upsample
+        self._pending = 0
+        self._lock = threading.Lock()
+        self._pool = None
+        # Workers that finished warm_up() (shared with the pool processes)
+        self._warm_count = multiprocessing.Value("i", 0)
+        self._inline_warm = False
+
+    def _get_pool(self):
+        if self.workers > 0 and self._pool is None:
+            with self._lock:
+                if self._pool is None:
+                    self._pool = ProcessPoolExecutor(
+                        max_workers=self.workers,
+                        initializer=_init_worker,
+                        initargs=(self._warm_count,)
+                    )
+        return self._pool
+
+    @property
+    def warm_workers(self):
+        return self._warm_count.value
+
+    @property
+    def ready(self):
+        """True once every worker (or the inline path) has been warmed."""
+        if self.workers <= 0:
+            return self._inline_warm
+        return self._pool is not None and self._warm_count.value >= self.workers
+
+    def start(self, timeout=120):
+        """
+        Spawn and warm the workers now rather than on the first login.
+        Blocks until they are all warm (or `timeout` seconds pass).
+        """
+        pool = self._get_pool()
+        if pool is None:
+            warm_up()
+            self._inline_warm = True
+            return self
+
+        for _ in range(self.workers):
+            pool.submit(time.sleep, 0)
+
+        deadline = time.time() + timeout
+        while not self.ready and time.time() < deadline:
+            time.sleep(0.1)
+        return self
+
+    def _options(self):
+        return self.detect_width, self.decode_reduce, self.upsample
+
+    @property
+    def pending(self):
+        return self._pending
+
+    def _release(self, _future=None):
+        with self._lock:
+            self._pending -= 1
+
+    def encode(self, data):
+        """
+        Encode one frame. Returns (encodings, timings) where timings holds
+        queue_ms / decode_ms / detect_ms / encode_ms. Raises FacePoolBusy
+        on overload.
+        """
+        with self._lock:
+            if self._pending >= self.max_pending:
+                raise FacePoolBusy()
+            self._pending += 1
+
+        submitted = time.time()
+        pool = self._get_pool()
+
+        # No pool configured (e.g. local debugging): run inline
+        if pool is None:
+            try:
+                encodings, timings = encode_frame(data, *self._options())
+            finally:
+                self._release()
+        else:
+            future = pool.submit(encode_frame, data, *self._options())
+            # Slot is freed when the worker finishes, even if we time out
+            future.add_done_callback(self._release)
+            try:
+                encodings, timings = future.result(timeout=self.timeout)
+            except FutureTimeout:
+                raise FacePoolBusy()
+
+        timings["queue_ms"] = _ms(submitted, timings.pop("started"))
+        return encodings, timings
+
+    def encode_burst(self, frames):
+        """
+        Encode several frames in parallel, yielding (encodings, timings) in
+        completion order. Only as many frames as there are free slots are
+        taken; closing the generator early cancels the frames not started.
+        """
+        with self._lock:
+            free = self.max_pending - self._pending
+            if free <= 0:
+                raise FacePoolBusy()
+            frames = frames[:free]
+            self._pending += len(frames)
+
+        submitted = time.time()
+        pool = self._get_pool()
+
+        if pool is None:
+            remaining = len(frames)
+            try:
+                for data in frames:
+                    encodings, timings = encode_frame(data, *self._options())
+                    self._release()
+                    remaining -= 1
+                    timings["queue_ms"] = _ms(submitted, timings.pop("started"))
+                    yield encodings, timings
+            finally:
+                for _ in range(remaining):
+                    self._release()
+            return
+
+        futures = []
+        for data in frames:
+            future = pool.submit(encode_frame, data, *self._options())
+            future.add_done_callback(self._release)
+            futures.append(future)
+
+        try:
+            for future in as_completed(futures, timeout=self.timeout):
+                encodings, timings = future.result()
+                timings["queue_ms"] = _ms(submitted, timings.pop("started"))
+                yield encodings, timings
+        except FutureTimeout:
+            raise FacePoolBusy()
+        finally:
+            # Early exit: frames still queued are dropped (running ones finish)
+            for future in futures:
+                future.cancel()
+
+    def shutdown(self):
+        if self._pool is not None:
+            self._pool.shutdown(wait=False, cancel_futures=True)
+            self._pool = None
@@ -0,0 +1,82 @@
+from googleapiclient.errors import HttpError
+
+# ================= GMAIL FETCH HELPERS =================
+# What a reply needs from the original: recipient, subject, RFC threading
+REPLY_HEADERS = ["Subject", "From", "Reply-To", "Message-ID", "References"]
+
+# Only the headers the inbox / sent lists show, plus what a reply needs
+INBOX_HEADERS = ["Subject", "From", "Date", "Reply-To", "Message-ID", "References"]
+SENT_HEADERS = ["Subject", "To", "Date"]
+
+# Gmail accepts up to 100 calls per batch; 50 keeps us clear of rate limits
+BATCH_SIZE = 50
+
+
+def header_value(headers, name, default=""):
+    name = name.lower()
+    return next((h["value"] for h in headers if h["name"].lower() == name), default)
+
+
+def _get_request(service, msg_id, fmt, headers):
+    kwargs = {"userId": "me", "id": msg_id, "format": fmt}
+    if headers:
+        kwargs["metadataHeaders"] = list(headers)
+    return service.users().messages().get(**kwargs)
+
+
+def batch_get(service, ids, fmt="metadata", headers=None, batch_size=BATCH_SIZE,
+              executor=None):
+    """
+    Fetch many messages through the Gmail batch endpoint: one HTTP round
+    trip per `batch_size` ids instead of one per message. With an
+    `executor`, the batches go out concurrently (the service must be
+    thread-safe, as the pooled ones are).
+
+    Returns the messages in the same order as `ids`; an entry is None if
+    that message could not be fetched (e.g. deleted in the meantime).
+    """
+    results = {}
+    failed = []
+
+    def collect(request_id, response, exception):
+        if exception is None:
+            results[request_id] = response
+        else:
+            failed.append(request_id)
+
+    def execute(chunk):
+        batch = service.new_batch_http_request(callback=collect)
+        for msg_id in chunk:
+            batch.add(_get_request(service, msg_id, fmt, headers), request_id=msg_id)
+        batch.execute()
+
+    chunks = [ids[start:start + batch_size] for start in range(0, len(ids), batch_size)]
+    if executor is not None and len(chunks) > 1:
+        # ⚡ Fan out; list() waits for all and re-raises the first error
+        list(executor.map(execute, chunks))
+    else:
+        for chunk in chunks:
+            execute(chunk)
+
+    # 🔁 Parts of a batch can be rate limited (429); retry those one by one
+    for msg_id in failed:
+        try:
+            results[msg_id] = _get_request(service, msg_id, fmt, headers).execute(num_retries=2)
+        except HttpError as e:
+            print("⚠️ Gmail get failed:", msg_id, e)
+
+    return [results.get(msg_id) for msg_id in ids]
+
+
+def reply_headers(headers):
+    """Cached header dict -> REPLY_HEADERS subset, None if any is missing."""
+    if headers and all(h in headers for h in REPLY_HEADERS):
+        return {h: headers[h] for h in REPLY_HEADERS}
+    return None
+
+
+def fetch_reply_headers(service, msg_id):
+    """Metadata-only fetch of REPLY_HEADERS (cache miss)."""
+    original = _get_request(service, msg_id, "metadata", REPLY_HEADERS).execute()
+    headers = original.get("payload", {}).get("headers", [])
+    return {h: header_value(headers, h) for h in REPLY_HEADERS}
@@ -0,0 +1,148 @@
+import json
+import os
+import threading
+import time
+from collections import OrderedDict
+
+import httplib2
+from google_auth_httplib2 import AuthorizedHttp
+from googleapiclient import discovery_cache
+from googleapiclient.discovery import build_from_document
+
+# ================= GMAIL SERVICE POOL =================
+_discovery_lock = threading.Lock()
+_discovery_doc = None
+
+
+def discovery_document():
+    """
+    Gmail v1 discovery document, parsed once per process from a local
+    copy (GMAIL_DISCOVERY_DOC, else the one bundled with googleapiclient)
+    instead of being re-read for every build().
+    """
+    global _discovery_doc
+    with _discovery_lock:
+        if _discovery_doc is None:
+            path = os.getenv("GMAIL_DISCOVERY_DOC")
+            if path:
+                with open(path) as f:
+                    text = f.read()
+            else:
+                text = discovery_cache.get_static_doc("gmail", "v1")
+            if text is None:
+                raise RuntimeError("Gmail discovery document not found")
+            _discovery_doc = json.loads(text)
+        return _discovery_doc
+
+
+class PooledHttp:
+    """
+    Thread-safe stand-in for AuthorizedHttp. Each request borrows an idle
+    keep-alive httplib2 connection (LIFO, so the warmest one) and signs it
+    with the current credentials, so one service object can be shared by
+    all of a user's request threads. Tokens are refreshed only by the
+    CredentialCache (single-flight, saved to Mongo): a 401 is returned
+    as-is instead of refreshing the shared credentials here.
+    """
+
+    def __init__(self, credentials, size=4, timeout=60):
+        self.credentials = credentials
+        self.size = size
+        self.timeout = timeout
+        self._idle = []
+        self._lock = threading.Lock()
+
+    def _connect(self):
+        http = httplib2.Http(timeout=self.timeout)
+        # Same as googleapiclient.http.build_http: 308 is not a redirect
+        http.redirect_codes = http.redirect_codes - {308}
+        return http
+
+    def request(self, uri, method="GET", body=None, headers=None, **kwargs):
+        with self._lock:
+            conn = self._idle.pop() if self._idle else None
+        conn = conn or self._connect()
+
+        try:
+            result = AuthorizedHttp(
+                self.credentials, http=conn, refresh_status_codes=()
+            ).request(
+                uri, method, body=body, headers=headers, **kwargs
+            )
+        except Exception:
+            conn.close()
+            raise
+
+        with self._lock:
+            if len(self._idle) < self.size:
+                self._idle.append(conn)
+                conn = None
+        if conn is not None:
+            conn.close()
+        return result
+
+    def close(self):
+        with self._lock:
+            idle, self._idle = self._idle, []
+        for conn in idle:
+            conn.close()
+
+
+class GmailServicePool:
+    """
+    One built Gmail service per user, reused across requests with pooled
+    HTTP connections; services idle for `idle_ttl` seconds (or beyond
+    `max_users`, least recently used first) are closed.
+    """
+
+    def __init__(self, idle_ttl=600, max_users=256, connections=4, timeout=60,
+                 document=None):
+        self.idle_ttl = idle_ttl
+        self.max_users = max_users
+        self.connections = connections
+        self.timeout = timeout
+        self.document = document
+        self._entries = OrderedDict()   # key -> (service, http, last_used)
+        self._lock = threading.Lock()
+
+    def get(self, key, credentials):
+        now = time.monotonic()
+        with self._lock:
+            expired = self._evict(now)
+            entry = self._entries.pop(key, None)
+            if entry is None:
+                http = PooledHttp(credentials, self.connections, self.timeout)
+                service = build_from_document(
+                    self.document or discovery_document(), http=http
+                )
+            else:
+                service, http, _ = entry
+                # Freshly refreshed token from the caller / DB
+                http.credentials = credentials
+
+            self._entries[key] = (service, http, now)
+            while len(self._entries) > self.max_users:
+                expired.append(self._entries.popitem(last=False)[1][1])
+
+        for old in expired:
+            old.close()
+        return service
+
+    def drop(self, key):
+        with self._lock:
+            entry = self._entries.pop(key, None)
+        if entry is not None:
+            entry[1].close()
+
+    def _evict(self, now):
+        expired = []
+        while self._entries:
+            key, (_, http, last_used) = next(iter(self._entries.items()))
+            if now - last_used < self.idle_ttl:
+                break
+            del self._entries[key]
+            expired.append(http)
+        return expired
+
+    def __len__(self):
+        return len(self._entries)
@@ -0,0 +1,235 @@
+import re
+from functools import lru_cache
+
+# ================= VOICE COMMANDS =================
+# One table for every page: (intent, pages, phrases). "#" is a number
+# slot ("email three", "open 12", "the twenty first"). Pages match
+# window.CURRENT_PAGE; "reading" is read_mail while a mail is being read.
+LIST_PAGES = ("gmail_inbox", "gmail_sent")
+MAIL_PAGES = LIST_PAGES + ("read_mail",)
+
+COMMANDS = [
+    ("open_gmail", ("dashboard",), ("open gmail", "gmail", "go to gmail", "inbox")),
+    ("logout", ("dashboard",), ("logout", "log out", "sign out")),
+
+    ("pause", ("reading",), ("pause", "wait", "hold on")),
+    ("resume", ("reading",), ("resume", "continue", "go on")),
+    ("stop", ("reading",), ("stop", "stop reading", "quiet")),
+    ("back", ("reading",), ("back", "go back")),
+
+    ("read", MAIL_PAGES, ("read", "read email", "read mail", "read it")),
+    ("more", LIST_PAGES, ("more", "more emails", "more mails", "next page", "load more")),
+    ("open", LIST_PAGES, (
+        "open email #", "open mail #", "open message #", "open sent mail #",
+        "open #", "email #", "mail #", "message #", "sent mail #", "#",
+    )),
+    ("compose", MAIL_PAGES, ("compose", "new mail", "new email", "write email", "write mail")),
+    ("back", MAIL_PAGES, ("back", "go back")),
+]
+
+# Dropped before matching so "open the email number three please" works
+FILLERS = {
+    "the", "a", "an", "please", "um", "uh", "er", "hmm", "this", "that",
+    "my", "number", "no", "now", "okay", "ok", "hey", "and",
+}
+
+# ---------- NUMBERS ----------
+UNITS = {
+    "zero": 0, "one": 1, "two": 2, "three": 3, "four": 4, "five": 5, "six": 6,
+    "seven": 7, "eight": 8, "nine": 9, "ten": 10, "eleven": 11, "twelve": 12,
+    "thirteen": 13, "fourteen": 14, "fifteen": 15, "sixteen": 16,
+    "seventeen": 17, "eighteen": 18, "nineteen": 19,
+}
+TENS = {
+    "twenty": 20, "thirty": 30, "forty": 40, "fifty": 50,
+    "sixty": 60, "seventy": 70, "eighty": 80, "ninety": 90,
+}
+ORDINALS = {
+    "first": 1, "second": 2, "third": 3, "fourth": 4, "fifth": 5, "sixth": 6,
+    "seventh": 7, "eighth": 8, "ninth": 9, "tenth": 10, "eleventh": 11,
+    "twelfth": 12, "thirteenth": 13, "fourteenth": 14, "fifteenth": 15,
+    "sixteenth": 16, "seventeenth": 17, "eighteenth": 18, "nineteenth": 19,
+    "twentieth": 20, "thirtieth": 30, "fortieth": 40, "fiftieth": 50,
+}
+# What recognizers hear for a bare number after "email" / "open"
+HOMOPHONES = {"won": 1, "to": 2, "too": 2, "for": 4, "fore": 4, "ate": 8}
+
+_DIGITS = re.compile(r"^(\d+)(?:st|nd|rd|th)?$")
+_WORD = re.compile(r"[a-z0-9]+")
+
+NUMBER = "#"
+_END = None     # trie key holding the intent at the end of a phrase
+
+
+def tokens(text):
+    """'Open the e-mail #3, please.' -> ['open', 'email', '3']"""
+    words = _WORD.findall(text.lower().replace("e-mail", "email"))
+    return [w for w in words if w not in FILLERS]
+
+
+def parse_number(words, i, homophones=False):
+    """
+    Number starting at words[i] -> (value, next index), or (None, i).
+    Handles digits ("12", "3rd"), words up to the hundreds ("twenty two",
+    "one hundred five"), ordinals and, with `homophones`, "to" / "for".
+    """
+    if i >= len(words):
+        return None, i
+
+    match = _DIGITS.match(words[i])
+    if match:
+        return int(match.group(1)), i + 1
+
+    word = words[i]
+    if word in ORDINALS:
+        return ORDINALS[word], i + 1
+    if homophones and word in HOMOPHONES:
+        return HOMOPHONES[word], i + 1
+
+    value = None
+    j = i
+    if j < len(words) and words[j] in UNITS:
+        value = UNITS[words[j]]
+        j += 1
+        if j < len(words) and words[j] == "hundred":
+            value *= 100
+            j += 1
+
+    if j < len(words) and words[j] in TENS and (value is None or value % 100 == 0):
+        value = (value or 0) + TENS[words[j]]
+        j += 1
+        # "twenty two" / "twenty second"
+        if j < len(words) and 0 < UNITS.get(words[j], 0) < 10:
+            value += UNITS[words[j]]
+            j += 1
+        elif j < len(words) and 0 < ORDINALS.get(words[j], 0) < 10:
+            value += ORDINALS[words[j]]
+            j += 1
+    elif value is not None and value % 100 == 0 and value and j < len(words) and words[j] in UNITS:
+        # "one hundred five"
+        value += UNITS[words[j]]
+        j += 1
+
+    return value, j
+
+
+def _open_ended(words, end):
+    """A number that more speech could still extend ('twenty', 'one hundred')."""
+    last = words[end - 1] if end else ""
+    return last in TENS or last == "hundred"
+
+
+# ================= GRAMMAR =================
+class Grammar:
+    """
+    The commands available on one page, compiled into a token trie.
+    match() walks it from every word of the utterance and keeps the
+    longest phrase (the earliest one on a tie), so a command is found
+    inside a longer sentence the way the old includes() chains did,
+    but on word boundaries and with one pass per start word.
+    """
+
+    def __init__(self, page, commands):
+        self.page = page
+        self.trie = {}
+        vocabulary = set()
+
+        for intent, phrases in commands:
+            for phrase in phrases:
+                node = self.trie
+                for word in phrase.split():
+                    node = node.setdefault(word, {})
+                    if word != NUMBER:
+                        vocabulary.add(word)
+                node.setdefault(_END, intent)
+
+        # For the recognizer: the words to expect, and a prompt in the
+        # style of the commands to bias Whisper toward them
+        if any(NUMBER in p.split() for _, phrases in commands for p in phrases):
+            vocabulary |= set(UNITS) | set(TENS) | set(ORDINALS) | {"hundred"}
+        self.words = tuple(sorted(vocabulary))
+        self.prompt = ", ".join(
+            phrases[0].replace(NUMBER, "three").capitalize() for _, phrases in commands
+        ) + "."
+
+    def _walk(self, words, start):
+        """Longest phrase from words[start] -> (length, intent, number)."""
+        best = (0, None, None)
+        paths = [(self.trie, start, None)]
+
+        while paths:
+            node, i, number = paths.pop()
+            if _END in node and i - start > best[0]:
+                best = (i - start, node[_END], number)
+            if i >= len(words):
+                continue
+            if words[i] in node:
+                paths.append((node[words[i]], i + 1, number))
+            if NUMBER in node:
+                # "to" is only a number after a command word ("email to")
+                value, j = parse_number(words, i, homophones=i > start)
+                if value is not None:
+                    paths.append((node[NUMBER], j, value))
+        return best
+
+    def match(self, text):
+        """
+        Utterance -> {"intent", "number", "complete"} or None. `complete`
+        is False when trailing speech could still change the result
+        (an open-ended number like "email twenty").
+        """
+        words = tokens(text)
+        best = (0, None, None, 0)
+
+        for start in range(len(words)):
+            length, intent, number = self._walk(words, start)
+            if length > best[0]:
+                best = (length, intent, number, start + length)
+
+        length, intent, number, end = best
+        if not intent:
+            return None
+        return {
+            "intent": intent,
+            "number": number,
+            "complete": not (number is not None and _open_ended(words, end)),
+        }
+
+
+@lru_cache(maxsize=32)
+def grammar_for(page, reading=False):
+    """Compiled Grammar for a page (the reading commands while reading), or None."""
+    page = "reading" if reading else page
+    commands = [(intent, phrases) for intent, pages, phrases in COMMANDS if page in pages]
+    return Grammar(page, commands) if commands else None
+
+
+def match_command(text, page, reading=False):
+    grammar = grammar_for(page, reading)
+    return grammar.match(text) if grammar else None
+
+
+# ---------- BROWSER ----------
+def _export(node):
+    # JSON has no null keys: the end-of-phrase marker becomes "$"
+    return {("$" if k is _END else k): (v if k is _END else _export(v)) for k, v in node.items()}
+
+
+def client_grammar(*pages):
+    """
+    Compiled tries for `pages` plus the number tables, for voice_intents.js
+    to match Web Speech results in the browser without a round trip.
+    """
+    grammars = {}
+    for page in pages:
+        grammar = grammar_for(page, page == "reading")
+        if grammar:
+            grammars[page] = _export(grammar.trie)
+    return {
+        "grammars": grammars,
+        "fillers": sorted(FILLERS),
+        "units": UNITS,
+        "tens": TENS,
+        "ordinals": ORDINALS,
+        "homophones": HOMOPHONES,
+    }
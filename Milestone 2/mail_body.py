@@ -0,0 +1,164 @@
+import base64
+import binascii
+import html
+
+from gmail_client import header_value
+
+# ================= MESSAGE BODY =================
+# Bodies beyond this are cut (a few newsletters / pasted logs are MBs)
+MAX_BODY_BYTES = 512 * 1024
+
+# A forwarded message carries its own body, not the one to show
+_SKIP_CONTAINERS = ("message/rfc822",)
+
+
+def _is_attachment(part):
+    if part.get("filename"):
+        return True
+    if part.get("body", {}).get("attachmentId"):
+        return True
+    disposition = header_value(part.get("headers", []), "Content-Disposition")
+    return disposition.lower().startswith("attachment")
+
+
+def _charset(part):
+    ctype = header_value(part.get("headers", []), "Content-Type")
+    for param in ctype.split(";")[1:]:
+        key, _, value = param.strip().partition("=")
+        if key.lower() == "charset" and value:
+            return value.strip('"\'')
+    return "utf-8"
+
+
+def decode_part(part, max_bytes=MAX_BODY_BYTES):
+    """
+    Base64url body of one part -> str. Only the first `max_bytes` are
+    decoded; returns (text, truncated).
+    """
+    data = part["body"]["data"]
+    limit = (max_bytes + 2) // 3 * 4        # base64 chars for max_bytes
+    truncated = len(data) > limit
+    if truncated:
+        data = data[:limit]
+    data += "=" * (-len(data) % 4)
+
+    try:
+        raw = base64.urlsafe_b64decode(data)
+    except (binascii.Error, ValueError):
+        return "", False
+
+    try:
+        return raw.decode(_charset(part), errors="ignore"), truncated
+    except LookupError:
+        return raw.decode("utf-8", errors="ignore"), truncated
+
+
+class _Scope:
+    """One multipart container on the walk: where its children's bodies go."""
+    __slots__ = ("parent", "alternative", "text", "done")
+
+    def __init__(self, parent, alternative):
+        self.parent = parent
+        self.alternative = alternative
+        self.text = None        # alternative: best plain text so far
+        self.done = False
+
+
+def _settle(scope, html_part, text_part):
+    """
+    Hand a body found inside `scope` outwards. A multipart/alternative
+    keeps plain text and waits for an HTML sibling; any other container
+    takes the first body it gets. Returns (html_part, text_part) once the
+    whole message is decided, else None.
+    """
+    while scope is not None:
+        if scope.alternative:
+            if html_part is None:
+                scope.text = scope.text or text_part
+                return None
+            text_part = text_part or scope.text
+        scope.done = True
+        scope = scope.parent
+    return html_part, text_part
+
+
+def find_body_parts(payload):
+    """
+    Single pass over the MIME tree with an explicit stack, decoding
+    nothing, stopping as soon as the body is decided. Returns
+    (html_part, text_part), either possibly None.
+
+    HTML wins over plain text only between the alternatives of one
+    multipart/alternative (walked richest first, so the walk ends at its
+    first HTML part). In multipart/mixed, related etc. the first body in
+    document order wins, so an HTML footer or attached page never
+    replaces the main text. Attachments and forwarded messages are
+    skipped by headers alone.
+    """
+    root = _Scope(None, alternative=False)
+    stack = [(payload, root)]
+
+    while stack:
+        part, scope = stack.pop()
+        if scope.done:
+            continue            # that container already has its body
+
+        if part is None:
+            # End of an alternative: its plain text is the answer there
+            if scope.text is not None:
+                found = _settle(scope.parent, None, scope.text)
+                scope.done = True
+                if found:
+                    return found
+            continue
+
+        mime = part.get("mimeType", "").lower()
+
+        if mime.startswith("multipart/"):
+            inner = _Scope(scope, alternative=mime == "multipart/alternative")
+            children = part.get("parts", [])
+            if inner.alternative:
+                # Alternatives go from plainest to richest: richest pops first;
+                # the marker below them pops once all of them were seen
+                stack.append((None, inner))
+                stack.extend((p, inner) for p in children)
+            else:
+                # Reversed so parts pop in document order
+                stack.extend((p, inner) for p in reversed(children))
+            continue
+
+        if mime in _SKIP_CONTAINERS or _is_attachment(part):
+            continue
+
+        if not part.get("body", {}).get("data"):
+            continue
+
+        if mime == "text/html":
+            found = _settle(scope, part, None)
+        elif mime == "text/plain":
+            found = _settle(scope, None, part)
+        else:
+            continue
+        if found:
+            return found
+
+    return None, None
+
+
+def extract_body(payload, max_bytes=MAX_BODY_BYTES):
+    """Gmail payload -> HTML for read_email.html (HTML part preferred)."""
+    html_part, text_part = find_body_parts(payload)
+
+    # Prefer HTML
+    if html_part is not None:
+        body, truncated = decode_part(html_part, max_bytes)
+        if body:
+            return body + ("<p><i>(message truncated)</i></p>" if truncated else "")
+
+    if text_part is not None:
+        body, truncated = decode_part(text_part, max_bytes)
+        if body:
+            note = "\n\n(message truncated)" if truncated else ""
+            return f"<pre>{html.escape(body)}{note}</pre>"
+
+    return "No content found"
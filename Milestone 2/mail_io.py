@@ -0,0 +1,46 @@
+import asyncio
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from pymongo import AsyncMongoClient
+
+
+# ================= ASYNC MAIL I/O =================
+class MailIO:
+    """
+    One long-lived event loop, on its own thread, for the async mail views.
+
+    Flask runs every async view on a short-lived loop of its own, while an
+    AsyncMongoClient belongs to the loop it first ran on. So the views hand
+    their I/O coroutines to this loop with run(): Mongo reads there use the
+    native async driver, and blocking calls (the Gmail client, the pymongo
+    writes of a sync) go through asyncio.to_thread onto `workers` threads,
+    which lets independent round trips be gathered.
+    """
+
+    def __init__(self, uri, db_name, workers=8, **client_options):
+        self.pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="mail-io")
+        self.loop = asyncio.new_event_loop()
+        self.loop.set_default_executor(self.pool)
+        threading.Thread(target=self.loop.run_forever, name="mail-io-loop", daemon=True).start()
+
+        self.client = self.call(self._connect(uri, client_options))
+        self.db = self.client[db_name]
+
+    @staticmethod
+    async def _connect(uri, options):
+        # Created on the I/O loop, which then owns its connections
+        return AsyncMongoClient(uri, **options)
+
+    def call(self, coro, timeout=None):
+        """Run `coro` on the I/O loop from a plain thread and wait for it."""
+        return asyncio.run_coroutine_threadsafe(coro, self.loop).result(timeout)
+
+    async def run(self, coro):
+        """Await `coro` on the I/O loop from another loop (an async view)."""
+        return await asyncio.wrap_future(asyncio.run_coroutine_threadsafe(coro, self.loop))
+
+    def close(self):
+        self.call(self.client.close())
+        self.loop.call_soon_threadsafe(self.loop.stop)
+        self.pool.shutdown(wait=False)
@@ -0,0 +1,289 @@
+import asyncio
+
+from googleapiclient.errors import HttpError
+from pymongo import ASCENDING, DESCENDING, UpdateOne
+
+from gmail_client import batch_get, header_value
+
+# ================= LOCAL MAIL CACHE =================
+# History record types that can change what a label's list shows
+HISTORY_TYPES = ["messageAdded", "messageDeleted", "labelAdded", "labelRemoved"]
+
+
+class MailSync:
+    """
+    Per-user message-metadata store kept current with Gmail history.
+
+    The first view of a label lists and batch-fetches it once; afterwards
+    a refresh is a single users.history.list call from the stored
+    historyId, plus a metadata fetch for just the messages that arrived.
+    """
+
+    def __init__(self, db, initial_size=50, async_db=None, executor=None):
+        self.messages = db["mail_cache"]
+        self.state = db["mail_sync"]
+        self.initial_size = initial_size
+        # Async views read through the AsyncMongoClient collections; Gmail
+        # batch fetches of more than one batch fan out on `executor`
+        self.async_messages = async_db["mail_cache"] if async_db is not None else None
+        self.async_state = async_db["mail_sync"] if async_db is not None else None
+        self.executor = executor
+
+        self.messages.create_index(
+            [("user_id", ASCENDING), ("label", ASCENDING), ("msg_id", ASCENDING)],
+            unique=True
+        )
+        self.messages.create_index(
+            [("user_id", ASCENDING), ("label", ASCENDING), ("internal_date", DESCENDING)]
+        )
+        self.state.create_index(
+            [("user_id", ASCENDING), ("label", ASCENDING)], unique=True
+        )
+
+    # ---------- READ ----------
+    def cached(self, user_id, label, limit=20, skip=0, after=None):
+        """
+        Newest-first cached messages for `label`, without syncing.
+        `after` is the (internal_date, msg_id) of the last row already
+        shown (keyset cursor, stable while new mail arrives on top).
+        """
+        return list(
+            self.messages.find(_list_query(user_id, label, after), {"_id": 0})
+            .sort(NEWEST_FIRST)
+            .skip(skip)
+            .limit(limit)
+        )
+
+    def page(self, user_id, service, label, headers, limit=20, after=None):
+        """
+        One page of older messages after the `after` cursor. When the
+        local cache runs out, the next Gmail list page is fetched (once,
+        using the stored nextPageToken) so earlier pages are never re-read.
+        Returns (messages, has_more).
+        """
+        docs = self.cached(user_id, label, limit, after=after)
+        while len(docs) < limit and self._fetch_older(user_id, service, label, headers):
+            docs = self.cached(user_id, label, limit, after=after)
+
+        if len(docs) < limit:
+            return docs, False
+
+        state = self.state.find_one({"user_id": user_id, "label": label}) or {}
+        more = self.cached(user_id, label, 1, after=cursor_of(docs[-1]))
+        return docs, bool(more or state.get("next_page_token"))
+
+    # ---------- ASYNC READ ----------
+    async def cached_async(self, user_id, label, limit=20, after=None):
+        """cached() through the async driver (async_db)."""
+        cursor = (
+            self.async_messages.find(_list_query(user_id, label, after), {"_id": 0})
+            .sort(NEWEST_FIRST)
+            .limit(limit)
+        )
+        return await cursor.to_list(None)
+
+    async def page_async(self, user_id, service, label, headers, limit=20, after=None):
+        """
+        page() for async views: the cache reads are awaited on the async
+        driver, and only a Gmail list-page fetch (blocking client) goes to
+        a worker thread.
+        """
+        docs = await self.cached_async(user_id, label, limit, after=after)
+        while len(docs) < limit and await asyncio.to_thread(
+            self._fetch_older, user_id, service, label, headers
+        ):
+            docs = await self.cached_async(user_id, label, limit, after=after)
+
+        if len(docs) < limit:
+            return docs, False
+
+        state, more = await asyncio.gather(
+            self.async_state.find_one({"user_id": user_id, "label": label}),
+            self.cached_async(user_id, label, 1, after=cursor_of(docs[-1]))
+        )
+        return docs, bool(more or (state or {}).get("next_page_token"))
+
+    def following(self, user_id, label, msg_id, limit=3):
+        """Ids of the messages listed right after `msg_id`, or []."""
+        doc = self.messages.find_one(
+            {"user_id": user_id, "label": label, "msg_id": msg_id},
+            {"internal_date": 1, "msg_id": 1}
+        )
+        if doc is None:
+            return []
+        return [m["msg_id"] for m in self.cached(user_id, label, limit, after=cursor_of(doc))]
+
+    def headers(self, user_id, label, msg_id):
+        """Cached headers of one message, or None."""
+        doc = self.messages.find_one(
+            {"user_id": user_id, "label": label, "msg_id": msg_id}, {"headers": 1}
+        )
+        return doc["headers"] if doc else None
+
+    def forget(self, user_id):
+        """Drop everything cached for a user (e.g. Gmail was unlinked)."""
+        self.messages.delete_many({"user_id": user_id})
+        self.state.delete_many({"user_id": user_id})
+
+    # ---------- SYNC ----------
+    def sync(self, user_id, service, label, headers):
+        state = self.state.find_one({"user_id": user_id, "label": label})
+        if state is None:
+            return self.full_sync(user_id, service, label, headers)
+
+        try:
+            added, removed, history_id = self._history(service, label, state["history_id"])
+        except HttpError as e:
+            # 404: startHistoryId too old, Gmail no longer has the deltas
+            if e.resp.status == 404:
+                return self.full_sync(user_id, service, label, headers)
+            raise
+
+        if removed:
+            self.messages.delete_many(
+                {"user_id": user_id, "label": label, "msg_id": {"$in": list(removed)}}
+            )
+        if added:
+            self._store(user_id, service, label, headers, list(added))
+
+        if history_id != state["history_id"]:
+            self._save_state(user_id, label, history_id)
+
+    def full_sync(self, user_id, service, label, headers):
+        # Take the historyId before listing so nothing slips between the two
+        history_id = service.users().getProfile(userId="me").execute()["historyId"]
+
+        results = service.users().messages().list(
+            userId="me",
+            maxResults=self.initial_size,
+            labelIds=[label]
+        ).execute()
+        ids = [m["id"] for m in results.get("messages", [])]
+
+        self.messages.delete_many({"user_id": user_id, "label": label})
+        self._store(user_id, service, label, headers, ids)
+        self._save_state(
+            user_id, label, history_id,
+            next_page_token=results.get("nextPageToken")
+        )
+
+    def _fetch_older(self, user_id, service, label, headers):
+        """Pull the next Gmail list page into the cache; False when done."""
+        state = self.state.find_one({"user_id": user_id, "label": label}) or {}
+        token = state.get("next_page_token")
+        if not token:
+            return False
+
+        try:
+            results = service.users().messages().list(
+                userId="me",
+                maxResults=self.initial_size,
+                labelIds=[label],
+                pageToken=token
+            ).execute()
+        except HttpError as e:
+            print("⚠️ Gmail page fetch failed:", e)
+            self.state.update_one({"_id": state["_id"]}, {"$unset": {"next_page_token": ""}})
+            return False
+
+        ids = [m["id"] for m in results.get("messages", [])]
+        self._store(user_id, service, label, headers, ids)
+        self.state.update_one(
+            {"_id": state["_id"]},
+            {"$set": {"next_page_token": results.get("nextPageToken")}}
+        )
+        return bool(ids)
+
+    def _history(self, service, label, start_id):
+        # Last change wins, so archive-then-unarchive ends up as "added"
+        changes = {}
+        history_id = start_id
+        page_token = None
+
+        while True:
+            resp = service.users().history().list(
+                userId="me",
+                startHistoryId=start_id,
+                labelId=label,
+                historyTypes=HISTORY_TYPES,
+                pageToken=page_token
+            ).execute()
+
+            for record in resp.get("history", []):
+                for item in record.get("messagesAdded", []):
+                    if label in item["message"].get("labelIds", [label]):
+                        changes[item["message"]["id"]] = True
+                for item in record.get("labelsAdded", []):
+                    if label in item.get("labelIds", []):
+                        changes[item["message"]["id"]] = True
+                for item in record.get("labelsRemoved", []):
+                    if label in item.get("labelIds", []):
+                        changes[item["message"]["id"]] = False
+                for item in record.get("messagesDeleted", []):
+                    changes[item["message"]["id"]] = False
+
+            history_id = resp.get("historyId", history_id)
+            page_token = resp.get("nextPageToken")
+            if not page_token:
+                break
+
+        added = {msg_id for msg_id, present in changes.items() if present}
+        removed = {msg_id for msg_id, present in changes.items() if not present}
+        return added, removed, history_id
+
+    def _store(self, user_id, service, label, headers, ids):
+        ops = []
+        for msg_id, data in zip(ids, batch_get(service, ids, headers=headers, executor=self.executor)):
+            if not data:
+                continue
+            msg_headers = data.get("payload", {}).get("headers", [])
+            ops.append(UpdateOne(
+                {"user_id": user_id, "label": label, "msg_id": msg_id},
+                {"$set": {
+                    "thread_id": data.get("threadId"),
+                    "internal_date": int(data.get("internalDate", 0)),
+                    "headers": {h: header_value(msg_headers, h) for h in headers},
+                }},
+                upsert=True
+            ))
+        if ops:
+            self.messages.bulk_write(ops, ordered=False)
+
+    def _save_state(self, user_id, label, history_id, **extra):
+        self.state.update_one(
+            {"user_id": user_id, "label": label},
+            {"$set": {"history_id": history_id, **extra}},
+            upsert=True
+        )
+
+
+# ================= CURSORS =================
+NEWEST_FIRST = [("internal_date", DESCENDING), ("msg_id", DESCENDING)]
+
+
+def _list_query(user_id, label, after=None):
+    query = {"user_id": user_id, "label": label}
+    if after is not None:
+        date, msg_id = after
+        query["$or"] = [
+            {"internal_date": {"$lt": date}},
+            {"internal_date": date, "msg_id": {"$lt": msg_id}},
+        ]
+    return query
+
+
+def cursor_of(doc):
+    return doc["internal_date"], doc["msg_id"]
+
+
+def encode_cursor(doc):
+    return f"{doc['internal_date']}:{doc['msg_id']}"
+
+
+def decode_cursor(value):
+    """'<internal_date>:<msg_id>' -> tuple, or None for a missing/bad cursor."""
+    try:
+        date, msg_id = value.split(":", 1)
+        return int(date), msg_id
+    except (AttributeError, ValueError):
+        return None
@@ -0,0 +1,69 @@
+import time
+import uuid
+from contextlib import contextmanager
+from datetime import datetime, timedelta, timezone
+
+from pymongo.errors import DuplicateKeyError
+
+
+# ================= CROSS-PROCESS LOCK =================
+class LockTimeout(Exception):
+    """Raised when a lease could not be taken within the timeout."""
+
+
+def _now():
+    return datetime.now(timezone.utc)
+
+
+class MongoLock:
+    """
+    Named lease in Mongo (`locks`), held by one process at a time across
+    every worker and host sharing the database. A holder that dies loses
+    it after `ttl` seconds, so the critical section must be shorter.
+
+    Taking it is one upsert: it matches only a free or expired lease, and
+    if the lease is held, the insert it falls back to hits the unique _id.
+    """
+
+    def __init__(self, db, name, ttl=30, timeout=10, poll=0.05):
+        self.locks = db["locks"]
+        self.name = name
+        self.ttl = ttl
+        self.timeout = timeout
+        self.poll = poll
+
+    def acquire(self):
+        """Returns the owner token for release(); raises LockTimeout."""
+        token = uuid.uuid4().hex
+        deadline = time.monotonic() + self.timeout
+
+        while True:
+            now = _now()
+            try:
+                self.locks.update_one(
+                    {"_id": self.name, "$or": [{"owner": None}, {"expires": {"$lt": now}}]},
+                    {"$set": {"owner": token, "expires": now + timedelta(seconds=self.ttl)}},
+                    upsert=True
+                )
+                return token
+            except DuplicateKeyError:
+                pass    # held by someone else
+
+            if time.monotonic() > deadline:
+                raise LockTimeout(self.name)
+            time.sleep(self.poll)
+
+    def release(self, token):
+        # Only our own lease: after expiry it may belong to someone else
+        self.locks.update_one(
+            {"_id": self.name, "owner": token},
+            {"$set": {"owner": None}}
+        )
+
+    @contextmanager
+    def hold(self):
+        token = self.acquire()
+        try:
+            yield
+        finally:
+            self.release(token)
@@ -0,0 +1,172 @@
+import random
+import socket
+import threading
+from datetime import datetime, timedelta, timezone
+
+import httplib2
+from google.auth.exceptions import TransportError
+from googleapiclient.errors import HttpError
+from pymongo import ASCENDING, ReturnDocument
+from pymongo.errors import DuplicateKeyError
+
+# ================= OUTBOX =================
+# HTTP statuses from Gmail worth trying again
+RETRY_STATUSES = {408, 429, 500, 502, 503, 504}
+
+# Network trouble between us and Gmail (sockets, TLS, timeouts, token endpoint)
+TRANSPORT_ERRORS = (OSError, socket.timeout, httplib2.HttpLib2Error, TransportError)
+
+
+def _now():
+    return datetime.now(timezone.utc)
+
+
+def retryable(error):
+    if "GMAIL_REAUTH_REQUIRED" in str(error):
+        return False
+    if isinstance(error, HttpError):
+        return error.resp.status in RETRY_STATUSES
+    # Anything else (KeyError, TypeError...) is a bug: retrying won't help
+    return isinstance(error, TRANSPORT_ERRORS)
+
+
+class SendQueue:
+    """
+    Outbound mail persisted in Mongo (`outbox`) and delivered by worker
+    threads, so /send_mail can answer as soon as the mail is stored.
+
+    Jobs are claimed atomically (safe with several app processes), retried
+    with exponential backoff and jitter on transient errors, and keyed by
+    a client idempotency key so a resubmitted request is queued once.
+    Delivery is at-least-once: a worker that dies mid-send leaves the job
+    to be re-queued after `stale_after` seconds.
+    """
+
+    def __init__(self, db, deliver, workers=2, max_attempts=6, base_delay=2,
+                 max_delay=300, stale_after=120, poll=5):
+        self.jobs = db["outbox"]
+        self.deliver = deliver
+        self.workers = workers
+        self.max_attempts = max_attempts
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.stale_after = stale_after
+        self.poll = poll
+        self._wake = threading.Event()
+        self._stop = threading.Event()
+        self._threads = []
+        self._sweeper = None
+
+        self.jobs.create_index(
+            [("user_id", ASCENDING), ("key", ASCENDING)], unique=True
+        )
+        self.jobs.create_index([("status", ASCENDING), ("next_try", ASCENDING)])
+
+    # ---------- API ----------
+    def enqueue(self, user_id, key, mail):
+        """Store a mail for delivery; the existing job if `key` was seen."""
+        now = _now()
+        job = {
+            "user_id": user_id,
+            "key": key,
+            "mail": mail,
+            "status": "queued",
+            "attempts": 0,
+            "next_try": now,
+            "created_at": now,
+            "updated_at": now,
+        }
+        try:
+            self.jobs.insert_one(job)
+        except DuplicateKeyError:
+            return self.jobs.find_one({"user_id": user_id, "key": key})
+
+        self._wake.set()
+        return job
+
+    def status(self, user_id, job_id):
+        return self.jobs.find_one(
+            {"_id": job_id, "user_id": user_id},
+            {"mail": 0}
+        )
+
+    # ---------- WORKERS ----------
+    def start(self):
+        for i in range(self.workers - len(self._threads)):
+            t = threading.Thread(target=self._run, daemon=True, name=f"outbox-{i}")
+            t.start()
+            self._threads.append(t)
+
+        if self._sweeper is None:
+            self._sweeper = threading.Thread(target=self._sweep, daemon=True, name="outbox-sweep")
+            self._sweeper.start()
+
+    def stop(self):
+        self._stop.set()
+        self._wake.set()
+
+    def _run(self):
+        while not self._stop.is_set():
+            # Cleared before claiming so an enqueue in between is not missed
+            self._wake.clear()
+            job = self._claim()
+            if job is None:
+                self._wake.wait(self.poll)
+                continue
+            self._process(job)
+
+    def _sweep(self):
+        # On its own timer: steady enqueues keep the workers' wait from
+        # ever timing out, so stuck jobs must not depend on it
+        interval = max(self.poll, self.stale_after / 4)
+        while not self._stop.wait(interval):
+            try:
+                if self._requeue_stale():
+                    self._wake.set()
+            except Exception as e:
+                print("⚠️ Outbox sweep failed:", e)
+
+    def _claim(self):
+        now = _now()
+        return self.jobs.find_one_and_update(
+            {"status": "queued", "next_try": {"$lte": now}},
+            {"$set": {"status": "sending", "claimed_at": now, "updated_at": now},
+             "$inc": {"attempts": 1}},
+            sort=[("next_try", ASCENDING)],
+            return_document=ReturnDocument.AFTER
+        )
+
+    def _requeue_stale(self):
+        cutoff = _now() - timedelta(seconds=self.stale_after)
+        return self.jobs.update_many(
+            {"status": "sending", "claimed_at": {"$lt": cutoff}},
+            {"$set": {"status": "queued", "next_try": _now()}}
+        ).modified_count
+
+    def _process(self, job):
+        try:
+            gmail_id = self.deliver(job)
+        except Exception as e:
+            self._failed(job, e)
+            return
+
+        self.jobs.update_one(
+            {"_id": job["_id"]},
+            {"$set": {"status": "sent", "gmail_id": gmail_id, "updated_at": _now()},
+             "$unset": {"error": ""}}
+        )
+
+    def _failed(self, job, error):
+        attempts = job["attempts"]
+        update = {"error": str(error)[:500], "updated_at": _now()}
+
+        if retryable(error) and attempts < self.max_attempts:
+            delay = min(self.max_delay, self.base_delay * 2 ** (attempts - 1))
+            update["status"] = "queued"
+            update["next_try"] = _now() + timedelta(seconds=delay * random.uniform(0.5, 1.0))
+            print(f"⚠️ Send retry {attempts}/{self.max_attempts} in {delay}s:", error)
+        else:
+            update["status"] = "failed"
+            print("❌ Send failed:", error)
+
+        self.jobs.update_one({"_id": job["_id"]}, {"$set": update})
@@ -0,0 +1,159 @@
+import re
+from email.utils import parseaddr
+from html import unescape
+from html.parser import HTMLParser
+
+# ================= SPEAKABLE TEXT =================
+# Longest piece handed to speechSynthesis at once; long utterances stall
+# or get cut off in some browsers
+MAX_CHUNK_CHARS = 220
+
+# About 15 minutes of speech; past that a listener wants the mail on screen
+MAX_CHUNKS = 200
+
+# Never spoken: scripts, styles, and the quoted / signature blocks that
+# Gmail, Outlook, Apple Mail and Thunderbird mark up
+_SKIP_TAGS = {"script", "style", "head", "title", "noscript", "template", "svg"}
+_QUOTE_CLASSES = {
+    "gmail_quote", "gmail_signature", "gmail_extra", "moz-cite-prefix",
+    "moz-signature", "yahoo_quoted", "divrplyfwdmsg", "ms-outlook-signature",
+}
+_BLOCK_TAGS = {
+    "p", "div", "br", "li", "ul", "ol", "tr", "table", "h1", "h2", "h3",
+    "h4", "h5", "h6", "pre", "section", "article", "header", "footer", "hr",
+}
+_VOID_TAGS = {"br", "hr", "img", "input", "meta", "link", "area", "base", "col", "wbr"}
+
+# Trailing punctuation stays in the text so the sentence still ends
+_URL = re.compile(r"(?:https?://|www\.)[^\s<>\"]*[^\s<>\".,;:!?')\]]", re.I)
+_EMAIL = re.compile(r"<?([\w.+-]+@[\w-]+(?:\.[\w-]+)+)>?")
+
+# A line where the rest of the mail is quoted history or a signature
+_CUT_LINE = re.compile(
+    r"^(?:"
+    r"on .{4,200} wrote:?"                     # Gmail / Apple reply header
+    r"|-{2,}\s*original message\s*-{2,}"       # Outlook
+    r"|-{2,}\s*forwarded message\s*-{2,}"
+    r"|_{10,}"                                 # Outlook separator
+    r"|-- ?"                                   # RFC 3676 signature delimiter
+    r"|sent from my \w+.*"
+    r"|get outlook for \w+.*"
+    r")$",
+    re.I
+)
+_SENTENCE = re.compile(r"[^.!?\n]+(?:[.!?]+[\"')\]]*|\n|$)")
+
+
+class _TextExtractor(HTMLParser):
+    """HTML -> text with block breaks, skipping quoted and hidden parts."""
+
+    def __init__(self):
+        super().__init__(convert_charrefs=True)
+        self.out = []
+        self._skip = []      # stack of tags whose content is dropped
+
+    def handle_starttag(self, tag, attrs):
+        if self._skip:
+            if tag not in _VOID_TAGS:
+                self._skip.append(tag)
+            return
+
+        attrs = dict(attrs)
+        classes = set((attrs.get("class") or "").split())
+        hidden = "display:none" in (attrs.get("style") or "").replace(" ", "")
+        if tag in _SKIP_TAGS or tag == "blockquote" or hidden or classes & _QUOTE_CLASSES:
+            if tag not in _VOID_TAGS:
+                self._skip.append(tag)
+            return
+
+        if tag in _BLOCK_TAGS:
+            self.out.append("\n")
+
+    def handle_endtag(self, tag):
+        if self._skip:
+            # Tolerate sloppy mail HTML: unwind to the matching tag
+            if tag in self._skip:
+                while self._skip and self._skip.pop() != tag:
+                    pass
+            return
+        if tag in _BLOCK_TAGS:
+            self.out.append("\n")
+
+    def handle_data(self, data):
+        if not self._skip:
+            self.out.append(data)
+
+
+def html_to_text(body):
+    parser = _TextExtractor()
+    parser.feed(body)
+    parser.close()
+    return "".join(parser.out)
+
+
+def strip_quoted(text):
+    """Drop '>' quoted lines and everything from a reply header/signature on."""
+    lines = []
+    for line in text.splitlines():
+        stripped = line.strip()
+        if _CUT_LINE.match(stripped):
+            break
+        if stripped.startswith(">"):
+            continue
+        lines.append(stripped)
+    return "\n".join(lines)
+
+
+def clean_for_speech(text):
+    text = _URL.sub("link", text)
+    text = _EMAIL.sub(r"\1", text)
+    text = re.sub(r"[ \t\u00a0\u200b]+", " ", text)
+    text = re.sub(r"\blink(?:\s+link\b)+", "links", text)
+    return re.sub(r"\n\s*\n+", "\n", text).strip()
+
+
+def _split_long(sentence, limit):
+    while len(sentence) > limit:
+        # Prefer a clause boundary, then a word boundary
+        cut = max(sentence.rfind(", ", 0, limit), sentence.rfind("; ", 0, limit))
+        if cut < limit // 3:
+            cut = sentence.rfind(" ", 0, limit)
+        if cut <= 0:
+            cut = limit
+        yield sentence[:cut + 1].strip()
+        sentence = sentence[cut + 1:].strip()
+    if sentence:
+        yield sentence
+
+
+def sentence_chunks(text, limit=MAX_CHUNK_CHARS):
+    """Sentences (line breaks end one too), merged up to `limit` chars."""
+    chunks = []
+    for match in _SENTENCE.finditer(text):
+        sentence = match.group().strip()
+        if not any(c.isalnum() for c in sentence):
+            continue
+        for piece in _split_long(sentence, limit):
+            if chunks and len(chunks[-1]) + len(piece) < limit // 2:
+                chunks[-1] = f"{chunks[-1]} {piece}"
+            else:
+                chunks.append(piece)
+    return chunks
+
+
+def speech_chunks(body):
+    """Body as rendered for read_email.html -> ready-to-speak chunks."""
+    if body.startswith("<pre>") and body.endswith("</pre>"):
+        text = unescape(body[5:-6])
+    else:
+        text = html_to_text(body)
+    chunks = sentence_chunks(clean_for_speech(strip_quoted(text)))
+    if len(chunks) > MAX_CHUNKS:
+        chunks = chunks[:MAX_CHUNKS] + ["The rest of this email is too long to read aloud."]
+    return chunks
+
+
+def speakable_address(value):
+    """'Ann Lee <ann@example.com>' -> 'Ann Lee'; bare address otherwise."""
+    name, address = parseaddr(value)
+    return name or address or value
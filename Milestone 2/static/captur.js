@@ -1,23 +1,15 @@
+// Needs js/face_capture.js loaded first
 const video = document.getElementById("video");
 
-navigator.mediaDevices.getUserMedia({ video: true })
-  .then(stream => video.srcObject = stream);
+FaceCapture.startCamera(video);
 
 function capture() {
-  const canvas = document.createElement("canvas");
-  canvas.width = video.videoWidth;
-  canvas.height = video.videoHeight;
-
-  const ctx = canvas.getContext("2d");
-  ctx.drawImage(video, 0, 0);
-
-  const image = canvas.toDataURL("image/jpeg");
-
-  fetch("/verify_face", {
+  FaceCapture.captureFrame(video)
+  .then(frame => fetch("/verify_face", {
     method: "POST",
-    headers: { "Content-Type": "application/json" },
-    body: JSON.stringify({ image })
-  })
+    headers: { "Content-Type": "image/jpeg" },
+    body: frame
+  }))
   .then(res => res.json())
   .then(data => {
     if (data.status === "success") {
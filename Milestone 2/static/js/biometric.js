@@ -5,13 +5,12 @@ const registerBtn = document.getElementById("registerBtn");
 
 let lastResult = null;
 
-// Start camera
-navigator.mediaDevices.getUserMedia({ video: true })
-  .then(stream => video.srcObject = stream)
+// Start camera (capture helpers: face_capture.js)
+FaceCapture.startCamera(video)
   .catch(() => alert("Camera access denied"));
 
 // Button bindings
-verifyBtn.onclick = verifyFace;
+verifyBtn.onclick = () => verifyFace();
 retakeBtn.onclick = resetUI;
 registerBtn.onclick = () => window.location.href = "/register";
 
@@ -21,24 +20,35 @@ function verifyFace() {
   verifyBtn.className = "btn-primary loading";
   verifyBtn.innerText = "Verifying";
 
-  const canvas = document.createElement("canvas");
-  canvas.width = video.videoWidth;
-  canvas.height = video.videoHeight;
-  canvas.getContext("2d").drawImage(video, 0, 0);
-
-  fetch("/verify_face", {
+  FaceCapture.captureFrame(video)
+  .then(frame => fetch("/verify_face", {
     method: "POST",
-    headers: { "Content-Type": "application/json" },
-    body: JSON.stringify({
-      image: canvas.toDataURL("image/jpeg")
-    })
+    headers: { "Content-Type": "image/jpeg" },
+    body: frame
+  }))
+  .then(res => res.json())
+  .then(data => handleResponse(data, false))
+  .catch(() => showRetry("Unable to verify. Please try again."));
+}
+
+// 🔁 Second chance in the same attempt: burst of frames, averaged server-side
+function verifyBurst() {
+  verifyBtn.className = "btn-primary loading";
+  verifyBtn.innerText = "Verifying";
+
+  FaceCapture.captureBurst(video)
+  .then(frames => {
+    const form = new FormData();
+    frames.forEach((f, i) => form.append("frames", f, `frame${i}.jpg`));
+    form.append("average", "1");
+    return fetch("/verify_face", { method: "POST", body: form });
   })
   .then(res => res.json())
-  .then(data => handleResponse(data))
+  .then(data => handleResponse(data, true))
   .catch(() => showRetry("Unable to verify. Please try again."));
 }
 
-function handleResponse(data) {
+function handleResponse(data, wasBurst) {
   console.log("🔍 verify response:", data);
 
   verifyBtn.classList.remove("loading");
@@ -56,6 +66,13 @@ function handleResponse(data) {
     return;
   }
 
+  // 📸 Single frame missed → retry once with a burst before giving up
+  if (!wasBurst && (data.status === "fail" || data.status === "not_found") &&
+      FaceCapture.config.burst > 1) {
+    verifyBurst();
+    return;
+  }
+
   // ❌ FACE NOT FOUND
   if (data.status === "not_found") {
   lastResult = "not_found";
@@ -77,6 +94,13 @@ function handleResponse(data) {
 }
 
 
+  // ⏳ SERVER BUSY → retry automatically
+  if (data.status === "busy") {
+    verifyBtn.innerText = "Server busy, retrying";
+    setTimeout(wasBurst ? verifyBurst : verifyFace, (data.retry_after || 1) * 1000);
+    return;
+  }
+
   // ⚠️ OTHER ERROR
   showRetry("Unable to verify. Please try again.");
 }
@@ -0,0 +1,59 @@
+/*********************************
+ * FACE CAPTURE
+ * Camera and JPEG frame capture shared by every face page (login,
+ * registration). Resolution, JPEG quality and burst settings come
+ * from /face_config, so they change in one place on the server:
+ *   FaceCapture.startCamera(video)
+ *   FaceCapture.captureFrame(video)          -> Promise<Blob>
+ *   FaceCapture.captureBurst(video, count)   -> Promise<Blob[]>
+ *********************************/
+
+(function () {
+  // 📐 Defaults until /face_config answers (same as the server's)
+  const config = {
+    width: 640,
+    quality: 0.85,
+    burst: 3,
+    enroll_samples: 3,
+    burst_interval_ms: 150
+  };
+
+  fetch("/face_config")
+    .then(res => res.json())
+    .then(cfg => Object.assign(config, cfg))
+    .catch(() => {});
+
+  function startCamera(video) {
+    return navigator.mediaDevices.getUserMedia({ video: true })
+      .then(stream => {
+        video.srcObject = stream;
+        return stream;
+      });
+  }
+
+  function captureFrame(video) {
+    const scale = Math.min(1, config.width / video.videoWidth);
+    const canvas = document.createElement("canvas");
+    canvas.width = Math.round(video.videoWidth * scale);
+    canvas.height = Math.round(video.videoHeight * scale);
+    canvas.getContext("2d").drawImage(video, 0, 0, canvas.width, canvas.height);
+    // 📦 Raw JPEG Blob: no base64 / JSON overhead
+    return new Promise(resolve =>
+      canvas.toBlob(resolve, "image/jpeg", config.quality)
+    );
+  }
+
+  // 📸 Several frames a short interval apart (poor lighting, enrollment samples)
+  function captureBurst(video, count) {
+    const shots = [];
+    for (let i = 0; i < (count || config.burst); i++) {
+      shots.push(
+        new Promise(r => setTimeout(r, i * config.burst_interval_ms))
+          .then(() => captureFrame(video))
+      );
+    }
+    return Promise.all(shots);
+  }
+
+  window.FaceCapture = { config, startCamera, captureFrame, captureBurst };
+})();
@@ -0,0 +1,98 @@
+/*********************************
+ * MAIL LIST PAGES (inbox / sent)
+ * First page is rendered by the server; older mails are
+ * fetched from /gmail_page/<box> and appended as you scroll
+ *********************************/
+
+(function () {
+  const sentinel = document.getElementById("more-mail");
+  if (!sentinel) return;
+
+  const box = sentinel.dataset.box;
+  let pending = null;
+
+  /* ================= ROWS ================= */
+  function div(cls, text) {
+    const el = document.createElement("div");
+    el.className = cls;
+    el.textContent = text;   // 🔒 subjects are untrusted, never innerHTML
+    return el;
+  }
+
+  function inboxRow(mail) {
+    const a = document.createElement("a");
+    a.href = `/open_email/${encodeURIComponent(mail.id)}`;
+    a.className = "mail-link";
+    a.dataset.index = document.querySelectorAll(".mail-link").length;
+    a.style.cssText = "text-decoration:none;color:inherit";
+
+    const row = div("mail", "");
+    row.append(div("from", mail.from), div("subject", mail.subject));
+    a.append(row);
+    return a;
+  }
+
+  function sentRow(mail) {
+    const a = document.createElement("a");
+    a.href = `/open_sent/${mail.id}`;
+    a.className = "sent-mail";
+    a.dataset.index = document.querySelectorAll(".sent-mail").length + 1;
+    a.style.cssText = "text-decoration:none;color:inherit";
+
+    const left = div("left", "");
+    left.append(div("to", `To: ${mail.to}`), div("subject", mail.subject));
+
+    const row = div("mail", "");
+    row.append(left, div("date", mail.date));
+    a.append(row);
+    return a;
+  }
+
+  /* ================= LOAD MORE ================= */
+  // Resolves to the number of mails appended (0 when there are no more)
+  window.loadMoreMail = function () {
+    if (pending) return pending;
+
+    const cursor = sentinel.dataset.cursor;
+    if (!cursor) return Promise.resolve(0);
+
+    pending = fetch(`/gmail_page/${box}?cursor=${encodeURIComponent(cursor)}`)
+      .then(res => res.json())
+      .then(data => {
+        if (data.status !== "success") {
+          console.warn("📄 Page load failed:", data.status);
+          sentinel.dataset.cursor = "";
+          return 0;
+        }
+
+        const build = box === "inbox" ? inboxRow : sentRow;
+        data.emails.forEach(mail => sentinel.before(build(mail)));
+        sentinel.dataset.cursor = data.next_cursor || "";
+        return data.emails.length;
+      })
+      .catch(err => {
+        console.warn("📄 Page load failed:", err);
+        return 0;
+      })
+      .finally(() => {
+        pending = null;
+      });
+
+    return pending;
+  };
+
+  // Keeps loading until row `count` exists or the mailbox runs out
+  window.ensureMailLoaded = async function (selector, count) {
+    while (document.querySelectorAll(selector).length < count) {
+      if (!(await window.loadMoreMail())) break;
+    }
+    return document.querySelectorAll(selector);
+  };
+
+  /* ================= INFINITE SCROLL ================= */
+  if ("IntersectionObserver" in window) {
+    new IntersectionObserver(entries => {
+      if (entries[0].isIntersecting) window.loadMoreMail();
+    }, { rootMargin: "300px" }).observe(sentinel);
+  }
+})();
@@ -0,0 +1,242 @@
+/*********************************
+ * SERVER SPEECH RECOGNITION
+ * SpeechRecognition-compatible recognizer backed by /transcribe
+ * (local Whisper). Used where the browser has no Web Speech API:
+ *   const SR = window.SpeechRecognition || window.webkitSpeechRecognition
+ *           || window.ServerSpeechRecognition;
+ * Audio goes up in ~0.5 s Opus chunks while the user speaks; the
+ * utterance ends after a short silence, like the native recognizer.
+ * Set `grammar` to the page name when a voice command is expected: the
+ * server then decodes only that page's commands, ends the utterance as
+ * soon as one is complete, and puts it on the event as `e.command`.
+ *********************************/
+
+(function () {
+  if (!navigator.mediaDevices || !window.MediaRecorder) return;
+
+  const CHUNK_MS = 500;
+  const SILENCE_MS = 800;        // quiet after speech -> end of utterance
+  const NO_SPEECH_MS = 6000;     // nothing said at all -> give up
+  const MAX_MS = 15000;
+  const SPEECH_RMS = 0.02;
+
+  let unavailable = false;       // server said 501: no Whisper there
+
+  function pickMimeType() {
+    const types = ["audio/webm;codecs=opus", "audio/ogg;codecs=opus", "audio/webm"];
+    return types.find(t => MediaRecorder.isTypeSupported(t)) || "";
+  }
+
+  function resultEvent(text, isFinal, command) {
+    const alt = { transcript: text, confidence: isFinal ? 1 : 0 };
+    const result = [alt];
+    result.isFinal = isFinal;
+    const e = { resultIndex: 0, results: [result] };
+    if (command !== undefined) e.command = command;
+    return e;
+  }
+
+  class ServerSpeechRecognition {
+    constructor() {
+      this.lang = "en-US";
+      this.continuous = false;
+      this.interimResults = false;
+      this.grammar = null;         // page whose commands are expected
+      this.reading = false;
+      this.onstart = null;
+      this.onresult = null;
+      this.onerror = null;
+      this.onend = null;
+
+      this._stream = null;
+      this._recorder = null;
+      this._audioCtx = null;
+      this._timer = null;
+      this._sending = Promise.resolve();
+      this._aborted = false;
+      this._done = false;          // final transcript received
+      this._ended = false;
+      this._lastText = "";
+    }
+
+    /* ================= LIFECYCLE ================= */
+    start() {
+      if (unavailable) {
+        setTimeout(() => this._fail("service-not-allowed"), 0);
+        return;
+      }
+
+      this._id = Math.random().toString(36).slice(2) + Date.now().toString(36);
+
+      navigator.mediaDevices.getUserMedia({ audio: true })
+        .then(stream => {
+          if (this._aborted) {
+            stream.getTracks().forEach(t => t.stop());
+            return this._end();
+          }
+          this._stream = stream;
+          this._record(stream);
+          this._watchSilence(stream);
+          this.onstart && this.onstart();
+        })
+        .catch(() => this._fail("not-allowed"));
+    }
+
+    stop() {
+      if (this._recorder && this._recorder.state !== "inactive") {
+        this._recorder.stop();     // last chunk is sent with final=1
+      }
+      this._release();
+    }
+
+    abort() {
+      this._aborted = true;
+      this.stop();
+      this._end();
+    }
+
+    /* ================= CAPTURE ================= */
+    _record(stream) {
+      const mimeType = pickMimeType();
+      this._recorder = new MediaRecorder(stream, mimeType ? { mimeType } : {});
+      this._contentType = this._recorder.mimeType || mimeType || "audio/webm";
+
+      this._recorder.ondataavailable = e => {
+        const final = this._recorder.state === "inactive";
+        if (this._aborted || this._done) return;
+        // ⏳ In order: the server decodes the stream as one container
+        this._sending = this._sending.then(() => this._send(e.data, final));
+      };
+      this._recorder.start(CHUNK_MS);
+    }
+
+    _watchSilence(stream) {
+      const Ctx = window.AudioContext || window.webkitAudioContext;
+      if (!Ctx) {
+        this._timer = setTimeout(() => this.stop(), MAX_MS);
+        return;
+      }
+
+      this._audioCtx = new Ctx();
+      const analyser = this._audioCtx.createAnalyser();
+      analyser.fftSize = 1024;
+      this._audioCtx.createMediaStreamSource(stream).connect(analyser);
+
+      const buf = new Float32Array(analyser.fftSize);
+      const started = Date.now();
+      let heard = false;
+      let lastVoice = started;
+
+      const tick = () => {
+        analyser.getFloatTimeDomainData(buf);
+        let sum = 0;
+        for (let i = 0; i < buf.length; i++) sum += buf[i] * buf[i];
+        const now = Date.now();
+
+        if (Math.sqrt(sum / buf.length) > SPEECH_RMS) {
+          heard = true;
+          lastVoice = now;
+        }
+
+        if ((heard && now - lastVoice > SILENCE_MS)
+            || (!heard && now - started > NO_SPEECH_MS)
+            || now - started > MAX_MS) {
+          this.stop();
+          return;
+        }
+        this._timer = setTimeout(tick, 100);
+      };
+      tick();
+    }
+
+    _release() {
+      clearTimeout(this._timer);
+      if (this._audioCtx) {
+        this._audioCtx.close().catch(() => {});
+        this._audioCtx = null;
+      }
+      if (this._stream) {
+        this._stream.getTracks().forEach(t => t.stop());
+        this._stream = null;
+      }
+    }
+
+    /* ================= UPLOAD ================= */
+    _send(blob, final, retries = 3) {
+      if (this._done) return Promise.resolve();   // already answered mid-stream
+
+      let url = `/transcribe?stream=${this._id}&final=${final ? 1 : 0}`;
+      if (this.grammar) {
+        url += `&grammar=${encodeURIComponent(this.grammar)}&reading=${this.reading ? 1 : 0}`;
+      }
+
+      return fetch(url, {
+        method: "POST",
+        headers: { "Content-Type": this._contentType },
+        body: blob
+      })
+        .then(res => {
+          if (res.status === 501) unavailable = true;
+          if (res.status === 503 && retries > 0) {
+            // Busy: resend this chunk (later ones wait, the stream must stay
+            // in order), or only ask again for the final pass if it was stored
+            const wait = (parseInt(res.headers.get("Retry-After"), 10) || 1) * 1000;
+            return res.json().catch(() => ({})).then(data =>
+              new Promise(r => setTimeout(r, wait))
+                .then(() => this._send(data.stored ? new Blob() : blob, final, retries - 1))
+            );
+          }
+          if (!res.ok) throw new Error(`transcribe ${res.status}`);
+
+          return res.json().then(data => this._handle(data, final));
+        })
+        .catch(() => {
+          // A lost chunk leaves the stream undecodable: give up on it
+          if (this._done || this._aborted) return;
+          this._done = true;
+          this.stop();
+          this._fail("network");
+        });
+    }
+
+    _handle(data, final) {
+      if (this._aborted || this._done) return;
+      const text = (data.text || "").trim();
+      const command = this.grammar ? (data.command || null) : undefined;
+
+      if (!final && data.status === "final") {
+        // ⚡ Server heard a whole command: stop without waiting for silence
+        this._done = true;
+        this.stop();
+      } else if (!final) {
+        if (this.interimResults && text && text !== this._lastText) {
+          this._lastText = text;
+          this.onresult && this.onresult(resultEvent(text, false));
+        }
+        return;
+      }
+
+      this._done = true;
+      if (text) {
+        this.onresult && this.onresult(resultEvent(text, true, command));
+      } else {
+        this.onerror && this.onerror({ error: "no-speech" });
+      }
+      this._end();
+    }
+
+    _fail(error) {
+      this._release();
+      if (!this._aborted) this.onerror && this.onerror({ error });
+      this._end();
+    }
+
+    _end() {
+      if (this._ended) return;
+      this._ended = true;
+      this.onend && this.onend();
+    }
+  }
+
+  window.ServerSpeechRecognition = ServerSpeechRecognition;
+})();
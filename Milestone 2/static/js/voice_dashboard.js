@@ -12,7 +12,8 @@ function speak(text, onEnd = null) {
 
 /* 🎤 LISTEN FOR DASHBOARD COMMANDS */
 function startListening() {
-  const SR = window.SpeechRecognition || window.webkitSpeechRecognition;
+  const SR = window.SpeechRecognition || window.webkitSpeechRecognition
+    || window.ServerSpeechRecognition;   // local Whisper fallback
   if (!SR) return;
 
   recognition = new SR();
@@ -20,33 +21,39 @@ function startListening() {
   recognition.continuous = false;
   recognition.interimResults = false;
 
+  recognition.grammar = "dashboard";     // server recognizer: expect a command
+
   recognition.onresult = (e) => {
     const text = e.results[0][0].transcript.toLowerCase().trim();
     console.log("🎧 command:", text);
 
-    // OPEN GMAIL
-    if (text.includes("gmail")) {
-      speak("Opening Gmail.");
-      setTimeout(() => {
-        window.location.href = "/gmail";
-      }, 900);
-      return;
-    }
+    window.voiceCommand(e, "dashboard").then(cmd => {
+      const intent = cmd ? cmd.intent : null;
 
-    // LOGOUT (FULL APP)
-    if (text.includes("logout")) {
-      speak("Logging you out.");
-      setTimeout(() => {
-        window.location.href = "/logout";
-      }, 900);
-      return;
-    }
+      // OPEN GMAIL
+      if (intent === "open_gmail") {
+        speak("Opening Gmail.");
+        setTimeout(() => {
+          window.location.href = "/gmail";
+        }, 900);
+        return;
+      }
 
-    // UNKNOWN
-    speak(
-      "I did not understand. Say open Gmail or say logout.",
-      () => setTimeout(startListening, 800)
-    );
+      // LOGOUT (FULL APP)
+      if (intent === "logout") {
+        speak("Logging you out.");
+        setTimeout(() => {
+          window.location.href = "/logout";
+        }, 900);
+        return;
+      }
+
+      // UNKNOWN
+      speak(
+        "I did not understand. Say open Gmail or say logout.",
+        () => setTimeout(startListening, 800)
+      );
+    });
   };
 
   recognition.onerror = () => {
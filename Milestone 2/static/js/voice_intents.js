@@ -0,0 +1,116 @@
+/*********************************
+ * VOICE COMMANDS
+ * Spoken text -> command, matched in the browser against the tries
+ * compiled from the command table in intents.py (embedded by the page
+ * as window.VOICE_GRAMMAR). Same rules as Grammar.match on the server
+ * (benchmarks/bench_intents.py runs both and fails if they disagree);
+ * the server recognizer (server_speech.js) already returns the command
+ * with its result.
+ *********************************/
+
+(function () {
+  const G = window.VOICE_GRAMMAR || { grammars: {} };
+  const FILLERS = new Set(G.fillers || []);
+  const UNITS = G.units || {};
+  const TENS = G.tens || {};
+  const ORDINALS = G.ordinals || {};
+  const HOMOPHONES = G.homophones || {};
+  const has = (obj, k) => Object.prototype.hasOwnProperty.call(obj, k);
+
+  function tokens(text) {
+    const words = text.toLowerCase().replace(/e-mail/g, "email").match(/[a-z0-9]+/g) || [];
+    return words.filter(w => !FILLERS.has(w));
+  }
+
+  /* ================= NUMBERS ================= */
+  // [value, next index] or [null, i]
+  function parseNumber(words, i, homophones) {
+    if (i >= words.length) return [null, i];
+
+    const digits = words[i].match(/^(\d+)(?:st|nd|rd|th)?$/);
+    if (digits) return [parseInt(digits[1], 10), i + 1];
+
+    const word = words[i];
+    if (has(ORDINALS, word)) return [ORDINALS[word], i + 1];
+    if (homophones && has(HOMOPHONES, word)) return [HOMOPHONES[word], i + 1];
+
+    let value = null;
+    let j = i;
+    if (j < words.length && has(UNITS, words[j])) {
+      value = UNITS[words[j]];
+      j++;
+      if (j < words.length && words[j] === "hundred") {
+        value *= 100;
+        j++;
+      }
+    }
+
+    if (j < words.length && has(TENS, words[j]) && (value === null || value % 100 === 0)) {
+      value = (value || 0) + TENS[words[j]];
+      j++;
+      // "twenty two" / "twenty second"
+      if (j < words.length && UNITS[words[j]] > 0 && UNITS[words[j]] < 10) {
+        value += UNITS[words[j]];
+        j++;
+      } else if (j < words.length && ORDINALS[words[j]] > 0 && ORDINALS[words[j]] < 10) {
+        value += ORDINALS[words[j]];
+        j++;
+      }
+    } else if (value && value % 100 === 0 && j < words.length && has(UNITS, words[j])) {
+      // "one hundred five"
+      value += UNITS[words[j]];
+      j++;
+    }
+
+    return [value, j];
+  }
+
+  /* ================= MATCH ================= */
+  // Longest phrase from words[start]: [length, intent, number]
+  function walk(trie, words, start) {
+    let best = [0, null, null];
+    const paths = [[trie, start, null]];
+
+    while (paths.length) {
+      const [node, i, number] = paths.pop();
+      if (has(node, "$") && i - start > best[0]) best = [i - start, node["$"], number];
+      if (i >= words.length) continue;
+      if (has(node, words[i])) paths.push([node[words[i]], i + 1, number]);
+      if (has(node, "#")) {
+        // "to" is only a number after a command word ("email to")
+        const [value, j] = parseNumber(words, i, i > start);
+        if (value !== null) paths.push([node["#"], j, value]);
+      }
+    }
+    return best;
+  }
+
+  function matchCommand(text, page, reading) {
+    const trie = G.grammars[reading ? "reading" : page];
+    if (!trie) return null;
+
+    const words = tokens(text);
+    let best = [0, null, null, 0];
+    for (let start = 0; start < words.length; start++) {
+      const [length, intent, number] = walk(trie, words, start);
+      if (length > best[0]) best = [length, intent, number, start + length];
+    }
+
+    const [, intent, number, end] = best;
+    if (!intent) return null;
+    const last = end ? words[end - 1] : "";
+    return {
+      intent,
+      number,
+      complete: !(number !== null && (has(TENS, last) || last === "hundred"))
+    };
+  }
+
+  window.matchCommand = matchCommand;
+
+  // Resolves to { intent, number } or null
+  window.voiceCommand = function (e, page, reading) {
+    if (e.command !== undefined) return Promise.resolve(e.command);
+    return Promise.resolve(matchCommand(e.results[0][0].transcript, page, reading));
+  };
+})();
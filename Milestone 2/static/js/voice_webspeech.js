@@ -6,7 +6,8 @@ if (window.DISABLE_NAV_VOICE) {
   console.log("🔇 Navigation voice disabled");
 } else {
 
-  const SR = window.SpeechRecognition || window.webkitSpeechRecognition;
+  const SR = window.SpeechRecognition || window.webkitSpeechRecognition
+    || window.ServerSpeechRecognition;   // local Whisper fallback
   window.navRec = null;
   let voiceActive = false;
 
@@ -61,8 +62,10 @@ if (window.DISABLE_NAV_VOICE) {
       return;
     }
 
-    const text = `Subject ${mailSubject}. ${mailFrom}. ${mailBody}`;
-    chunks = splitText(text);
+    // 🔊 Server-prepared chunks when the page has them
+    chunks = window.mailChunks && window.mailChunks.length
+      ? window.mailChunks
+      : splitText(`Subject ${mailSubject}. ${mailFrom}. ${mailBody}`);
     index = 0;
     stopped = false;
 
@@ -95,20 +98,27 @@ if (window.DISABLE_NAV_VOICE) {
     speak("Reading stopped");
   }
 
-  /* ================= EMAIL NUMBER ================= */
-  function extractEmailIndex(text) {
-    const map = {
-      one:1,two:2,three:3,four:4,five:5,
-      six:6,seven:7,eight:8,nine:9,ten:10
-    };
+  /* ================= OPEN BY NUMBER ================= */
+  function openMail(idx) {
+    const sent = window.CURRENT_PAGE === "gmail_sent";
+    const label = sent ? "sent mail" : "email";
 
-    const digit = text.match(/\b(\d+)\b/);
-    if (digit) return parseInt(digit[1], 10) - 1;
+    loadedMails(sent ? ".sent-mail" : ".mail-link", idx + 1).then(mails => {
+      if (idx >= 0 && idx < mails.length) {
+        speak(`Opening ${label} ${idx + 1}`, () => {
+          window.location.href = mails[idx].href;
+        });
+      } else {
+        speak(`That ${label} number does not exist`);
+      }
+    });
+  }
 
-    for (let w in map) {
-      if (text.includes(w)) return map[w] - 1;
-    }
-    return null;
+  /* ================= LOADED MAILS ================= */
+  // Rows already on the page, fetching only the missing later pages
+  function loadedMails(selector, count) {
+    if (window.ensureMailLoaded) return window.ensureMailLoaded(selector, count);
+    return Promise.resolve(document.querySelectorAll(selector));
   }
 
   /* ================= START LISTENING ================= */
@@ -120,100 +130,79 @@ if (window.DISABLE_NAV_VOICE) {
     window.navRec.continuous = false;
     window.navRec.interimResults = false;
 
+    window.navRec.grammar = window.CURRENT_PAGE;      // server recognizer: expect a command
+    window.navRec.reading = window.isReadingMail;
+
     window.navRec.onresult = e => {
       const text = e.results[0][0].transcript.toLowerCase().trim();
       console.log("🎤 VOICE:", text);
 
-      /* 🔴 READING COMMANDS */
-      if (window.isReadingMail) {
-        if (text.includes("pause")) return pauseReading();
-        if (text.includes("resume") || text.includes("continue")) return resumeReading();
-        if (text.includes("stop")) return stopReading();
-        if (text.includes("back")) {
-          stopReading();
-          window.location.href = "/gmail_inbox";
-        }
-        return;
-      }
-
-      /* 📖 READ EMAIL */
-      if (text.includes("read")) {
-        speak("Reading this email", readCurrentEmail);
-        return;
-      }
-
-      /* 📬 OPEN EMAIL */
-      if (window.CURRENT_PAGE === "gmail_inbox") {
-        const idx = extractEmailIndex(text);
-        if (idx !== null) {
-          const mails = document.querySelectorAll(".mail-link");
-          if (idx >= 0 && idx < mails.length) {
-            speak(`Opening email ${idx + 1}`, () => {
-              window.location.href = mails[idx].href;
-            });
-          } else {
-            speak("That email number does not exist");
+      const reading = window.isReadingMail;
+      window.voiceCommand(e, window.CURRENT_PAGE, reading).then(cmd => {
+        const intent = cmd ? cmd.intent : null;
+
+        /* 🔴 READING COMMANDS */
+        if (reading) {
+          if (intent === "pause") return pauseReading();
+          if (intent === "resume") return resumeReading();
+          if (intent === "stop") return stopReading();
+          if (intent === "back") {
+            stopReading();
+            window.location.href = "/gmail_inbox";
           }
           return;
         }
-      }
 
-      /* 📤 SENT */
-      /* 📤 SENT MAIL HANDLING */
-if (window.CURRENT_PAGE === "gmail_sent") {
+        switch (intent) {
+          /* 📖 READ EMAIL */
+          case "read":
+            speak("Reading this email", readCurrentEmail);
+            return;
+
+          /* 📄 MORE MAILS */
+          case "more":
+            if (!window.loadMoreMail) break;
+            window.loadMoreMail().then(n => {
+              speak(n ? `Loaded ${n} more emails` : "No more emails");
+            });
+            return;
 
-  // 🔢 open sent mail one / two / 1 / 2
-  const idx = extractEmailIndex(text);
+          /* 📬 OPEN EMAIL / 📤 SENT MAIL (one / two / 1 / 2) */
+          case "open":
+            openMail(cmd.number - 1);
+            return;
 
-  if (idx !== null) {
-    const sentMails = document.querySelectorAll(".sent-mail");
+          /* ✍️ COMPOSE */
+          case "compose":
+            speak("Opening compose mail", () => {
+              window.location.href = "/compose";
+            });
+            return;
+
+          /* 🔙 GO BACK */
+          case "back":
+            speechSynthesis.cancel();
+            window.isReadingMail = false;
+            window.isReadingPaused = false;
+
+            if (
+              window.CURRENT_PAGE === "gmail_sent" ||
+              window.CURRENT_PAGE === "read_mail" ||
+              window.CURRENT_PAGE === "compose"
+            ) {
+              speak("Going back to inbox", () => {
+                window.location.href = "/gmail_inbox";
+              });
+            } else {
+              speak("Going back", () => {
+                window.location.href = "/dashboard";
+              });
+            }
+            return;
+        }
 
-    if (idx >= 0 && idx < sentMails.length) {
-      speak(`Opening sent mail ${idx + 1}`, () => {
-        window.location.href = sentMails[idx].href;
+        speak("Command not recognized");
       });
-    } else {
-      speak("That sent mail number does not exist");
-    }
-    return;
-  }
-}
-
-
-      /* ✍️ COMPOSE */
-      if (text.includes("compose") || text.includes("new mail")) {
-        speak("Opening compose mail", () => {
-          window.location.href = "/compose";
-        });
-        return;
-      }
-
-      /* 🔙 BACK */
-      /* 🔙 GO BACK */
-if (text.includes("back") || text.includes("go back")) {
-
-  speechSynthesis.cancel();
-  window.isReadingMail = false;
-  window.isReadingPaused = false;
-
-  if (
-    window.CURRENT_PAGE === "gmail_sent" ||
-    window.CURRENT_PAGE === "read_mail" ||
-    window.CURRENT_PAGE === "compose"
-  ) {
-    speak("Going back to inbox", () => {
-      window.location.href = "/gmail_inbox";
-    });
-  } else {
-    speak("Going back", () => {
-      window.location.href = "/dashboard";
-    });
-  }
-  return;
-}
-
-
-      speak("Command not recognized");
     };
 
     window.navRec.onend = () => {
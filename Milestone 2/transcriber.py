@@ -0,0 +1,352 @@
+import importlib.util
+import multiprocessing
+import shutil
+import subprocess
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor, TimeoutError as FutureTimeout
+
+import numpy as np
+
+# ================= WHISPER TRANSCRIPTION POOL =================
+SAMPLE_RATE = 16000
+
+# Content types accepted by /transcribe
+PCM_TYPES = ("audio/l16", "audio/pcm", "audio/x-raw")
+COMPRESSED_TYPES = ("audio/webm", "audio/ogg", "audio/opus", "audio/wav", "audio/x-wav")
+
+# PCM rates accepted from the client (rate=0 would divide by zero, rate=1
+# would make resample() allocate 16000 samples per input sample)
+MIN_PCM_RATE = 8000
+MAX_PCM_RATE = 48000
+
+
+class TranscriberBusy(Exception):
+    """Raised when too many clips are already waiting for the pool."""
+
+
+def available():
+    """openai-whisper is installed and ffmpeg is on PATH (whisper needs both)."""
+    return importlib.util.find_spec("whisper") is not None and shutil.which("ffmpeg") is not None
+
+
+# ================= AUDIO =================
+def pcm16_to_float(data):
+    """16-bit little-endian mono PCM -> float32 in [-1, 1]."""
+    data = data[:len(data) // 2 * 2]
+    return np.frombuffer(data, "<i2").astype(np.float32) / 32768.0
+
+
+def pcm_rate(content_type):
+    """
+    Sample rate from 'audio/l16;rate=N' (SAMPLE_RATE if not given).
+    Raises ValueError outside MIN_PCM_RATE..MAX_PCM_RATE.
+    """
+    rate = SAMPLE_RATE
+    for param in content_type.split(";")[1:]:
+        key, _, value = param.strip().partition("=")
+        if key.strip().lower() == "rate":
+            if not value.strip().isdigit():
+                raise ValueError(f"bad sample rate {value!r}")
+            rate = int(value)
+    if not MIN_PCM_RATE <= rate <= MAX_PCM_RATE:
+        raise ValueError(f"sample rate {rate} outside {MIN_PCM_RATE}-{MAX_PCM_RATE}")
+    return rate
+
+
+def resample(audio, rate):
+    if rate == SAMPLE_RATE or not len(audio):
+        return audio
+    n = int(round(len(audio) * SAMPLE_RATE / rate))
+    return np.interp(
+        np.linspace(0, len(audio) - 1, n), np.arange(len(audio)), audio
+    ).astype(np.float32)
+
+
+def decode_compressed(data):
+    """Opus/WebM/Ogg/WAV bytes -> 16 kHz mono float32, via ffmpeg."""
+    proc = subprocess.run(
+        ["ffmpeg", "-nostdin", "-loglevel", "quiet", "-i", "pipe:0",
+         "-f", "s16le", "-ac", "1", "-ar", str(SAMPLE_RATE), "pipe:1"],
+        input=bytes(data), capture_output=True
+    )
+    # A stream cut mid-frame still decodes up to the cut; keep what we got
+    return pcm16_to_float(proc.stdout)
+
+
+# Most tokens a command needs ("open sent mail one hundred five.")
+COMMAND_SAMPLE_LEN = 16
+
+# ================= WORKER =================
+_model = None
+_suppress = {}      # command vocabulary -> token ids Whisper may not emit
+
+
+def _init_worker(model_name, threads, warm_count):
+    global _model
+    import torch
+    import whisper
+
+    torch.set_num_threads(threads)
+    _model = whisper.load_model(model_name, device="cpu")
+    # One pass over silence pulls the weights and kernels in before real audio
+    _model.transcribe(np.zeros(SAMPLE_RATE, np.float32), language="en", fp16=False)
+    with warm_count.get_lock():
+        warm_count.value += 1
+
+
+def command_suppress_tokens(words, language="en"):
+    """
+    Every text token except the pieces of `words` (as spelled, capitalized,
+    with and without a leading space), digits and punctuation. Suppressing
+    them limits decoding to the command vocabulary. Cached per worker.
+    """
+    if words in _suppress:
+        return _suppress[words]
+
+    from whisper.tokenizer import get_tokenizer
+    tokenizer = get_tokenizer(_model.is_multilingual, language=language, task="transcribe")
+
+    allowed = set()
+    for word in words:
+        for variant in (word, word.capitalize()):
+            allowed.update(tokenizer.encode(variant))
+            allowed.update(tokenizer.encode(" " + variant))
+
+    for token in range(tokenizer.eot):
+        piece = tokenizer.decode([token]).strip()
+        if not piece or piece.isdigit() or all(not c.isalnum() for c in piece):
+            allowed.add(token)
+
+    _suppress[words] = [t for t in range(tokenizer.eot) if t not in allowed]
+    return _suppress[words]
+
+
+def transcribe_audio(audio, language="en", prompt=None, words=None):
+    """
+    float32 16 kHz audio -> (segments, timings). Segments are
+    (start_s, end_s, text). With `words`, decoding is held to that
+    command vocabulary and cut short. Runs inside a pool worker.
+    """
+    started = time.time()
+    options = {}
+    if words:
+        options = {
+            "suppress_tokens": command_suppress_tokens(words, language),
+            "sample_len": COMMAND_SAMPLE_LEN,
+            "without_timestamps": True,
+        }
+
+    result = _model.transcribe(
+        audio,
+        language=language,
+        fp16=False,
+        temperature=0.0,                    # greedy: no fallback re-decodes
+        condition_on_previous_text=False,
+        initial_prompt=prompt,
+        **options
+    )
+    segments = [
+        (s["start"], s["end"], s["text"].strip())
+        for s in result["segments"] if s["text"].strip()
+    ]
+    return segments, {
+        "started": started,
+        "decode_ms": round((time.time() - started) * 1000, 1),
+        "audio_s": round(len(audio) / SAMPLE_RATE, 2),
+    }
+
+
+class Transcriber:
+    """
+    Bounded process pool of CPU Whisper models, loaded once per worker.
+
+    Decoding holds a core for roughly the clip length times the model's
+    real-time factor, so it runs in worker processes (each limited to
+    `threads` torch threads) and request threads only wait on a future.
+    Once `max_pending` clips are queued, new ones are rejected with
+    TranscriberBusy.
+    """
+
+    def __init__(self, model="base.en", workers=1, threads=2, max_pending=4,
+                 timeout=30, language="en"):
+        self.model = model
+        self.workers = workers
+        self.threads = threads
+        self.max_pending = max_pending
+        self.timeout = timeout
+        self.language = language
+        self._pending = 0
+        self._lock = threading.Lock()
+        self._pool = None
+        # Workers that finished loading the model (shared with the pool processes)
+        self._warm_count = multiprocessing.Value("i", 0)
+
+    def _get_pool(self):
+        if self._pool is None:
+            with self._lock:
+                if self._pool is None:
+                    self._pool = ProcessPoolExecutor(
+                        max_workers=self.workers,
+                        initializer=_init_worker,
+                        initargs=(self.model, self.threads, self._warm_count)
+                    )
+        return self._pool
+
+    @property
+    def warm_workers(self):
+        return self._warm_count.value
+
+    @property
+    def ready(self):
+        return self._pool is not None and self._warm_count.value >= self.workers
+
+    def start(self, timeout=300):
+        """Load the model in every worker now rather than on first use."""
+        pool = self._get_pool()
+        for _ in range(self.workers):
+            pool.submit(time.sleep, 0)
+
+        deadline = time.time() + timeout
+        while not self.ready and time.time() < deadline:
+            time.sleep(0.2)
+        return self
+
+    def _release(self, _future=None):
+        with self._lock:
+            self._pending -= 1
+
+    def transcribe(self, audio, prompt=None, words=None):
+        """Returns (segments, timings); raises TranscriberBusy on overload."""
+        with self._lock:
+            if self._pending >= self.max_pending:
+                raise TranscriberBusy()
+            self._pending += 1
+
+        submitted = time.time()
+        future = self._get_pool().submit(
+            transcribe_audio, audio, self.language, prompt, words
+        )
+        # Slot is freed when the worker finishes, even if we time out
+        future.add_done_callback(self._release)
+        try:
+            segments, timings = future.result(timeout=self.timeout)
+        except FutureTimeout:
+            raise TranscriberBusy()
+
+        timings["queue_ms"] = round((timings.pop("started") - submitted) * 1000, 1)
+        return segments, timings
+
+    def shutdown(self):
+        if self._pool is not None:
+            self._pool.shutdown(wait=False, cancel_futures=True)
+            self._pool = None
+
+
+# ================= STREAMING SESSIONS =================
+class AudioStream:
+    """
+    One utterance arriving in chunks. Each transcription pass covers only
+    the audio after the last committed segment: when Whisper returns more
+    than one segment, all but the last are final (later audio will not
+    change them) and the window moves past them.
+    """
+
+    def __init__(self, content_type):
+        """Raises ValueError for an unusable PCM rate (see pcm_rate)."""
+        self.content_type = content_type
+        self.rate = pcm_rate(content_type)
+        self.raw = bytearray()          # compressed streams: whole container
+        self.audio = np.zeros(0, np.float32)
+        self.offset = 0                 # samples already committed
+        self.committed = []
+        self.tail = ""
+        self.transcribed_upto = 0       # samples covered by the last pass
+        self.last_seen = time.monotonic()
+        self.lock = threading.Lock()
+
+    @property
+    def compressed(self):
+        return self.content_type.split(";")[0].strip().lower() in COMPRESSED_TYPES
+
+    def append(self, chunk):
+        self.last_seen = time.monotonic()
+        if self.compressed:
+            # Opus/WebM chunks are not independently decodable: the header
+            # lives in the first one, so decode the container so far
+            self.raw += chunk
+            self.audio = decode_compressed(self.raw)
+        else:
+            self.audio = np.concatenate([self.audio, resample(pcm16_to_float(chunk), self.rate)])
+
+    @property
+    def seconds(self):
+        return len(self.audio) / SAMPLE_RATE
+
+    def text(self):
+        return " ".join(self.committed + ([self.tail] if self.tail else [])).strip()
+
+    def trailing_silence(self, seconds=0.3, level=0.01):
+        """The last `seconds` of audio are quiet (the speaker has stopped)."""
+        tail = self.audio[-int(seconds * SAMPLE_RATE):]
+        return len(tail) > 0 and float(np.sqrt(np.mean(tail ** 2))) < level
+
+    def update(self, transcriber, final, min_new=1.0, max_window=25.0, grammar=None):
+        """
+        Transcribe the uncommitted window if at least `min_new` seconds
+        arrived since the last pass (always on `final`). A `grammar`
+        (intents.Grammar) prompts and restricts decoding to its commands.
+        Returns timings or None if no pass was needed.
+        """
+        new = (len(self.audio) - self.transcribed_upto) / SAMPLE_RATE
+        window = self.audio[self.offset:]
+        if len(window) < SAMPLE_RATE // 4 or (not final and new < min_new):
+            return None
+
+        if grammar is not None:
+            prompt, words = grammar.prompt, grammar.words
+        else:
+            # Committed text as the prompt keeps wording consistent across passes
+            prompt, words = " ".join(self.committed)[-200:] or None, None
+        segments, timings = transcriber.transcribe(window, prompt, words)
+        self.transcribed_upto = len(self.audio)
+
+        if final:
+            self.committed += [s[2] for s in segments]
+            self.tail = ""
+        elif len(segments) > 1 or (segments and len(window) / SAMPLE_RATE > max_window):
+            keep = segments[-1] if len(segments) > 1 else None
+            done = segments[:-1] if keep else segments
+            self.committed += [s[2] for s in done]
+            self.offset += int((keep[0] if keep else segments[-1][1]) * SAMPLE_RATE)
+            self.tail = keep[2] if keep else ""
+        else:
+            self.tail = segments[0][2] if segments else ""
+        return timings
+
+
+class StreamRegistry:
+    """In-process AudioStreams by client session id, dropped when idle."""
+
+    def __init__(self, idle_ttl=60, max_streams=64):
+        self.idle_ttl = idle_ttl
+        self.max_streams = max_streams
+        self._streams = {}
+        self._lock = threading.Lock()
+
+    def get(self, stream_id, content_type):
+        now = time.monotonic()
+        with self._lock:
+            for key in [k for k, s in self._streams.items() if now - s.last_seen > self.idle_ttl]:
+                del self._streams[key]
+
+            stream = self._streams.get(stream_id)
+            if stream is None:
+                if len(self._streams) >= self.max_streams:
+                    raise TranscriberBusy()
+                stream = self._streams[stream_id] = AudioStream(content_type)
+            return stream
+
+    def drop(self, stream_id):
+        with self._lock:
+            self._streams.pop(stream_id, None)